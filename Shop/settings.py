@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.QueryStatsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -40,6 +41,15 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'Shop.urls'
 
+QUERY_STATS_HEADERS = DEBUG
+# С этим заголовком запроса с адреса из INTERNAL_IPS (его шлет benchmark_shop) сервер отдает X-Query-Count
+# и без DEBUG, а debug toolbar не подключается: он сам замедляет ответ в разы
+BENCHMARK_HEADER = 'HTTP_X_BENCHMARK'
+DEBUG_TOOLBAR_CONFIG = {'SHOW_TOOLBAR_CALLBACK': 'app.middleware.show_toolbar'}
+QUERY_STATS_DUPLICATE_THRESHOLD = 5
+QUERY_STATS_FLUSH_INTERVAL = 60
+QUERY_STATS_CACHE_ALIAS = 'query_stats'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -51,6 +61,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.context_processors.user_summary',
             ],
         },
     },
@@ -58,11 +69,139 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Shop.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль БД задается окружением: по умолчанию SQLite, DB_ENGINE=postgresql — PostgreSQL.
+# CONN_MAX_AGE держит соединение между запросами вместо нового подключения на каждый запрос
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'shop'),
+            'USER': os.environ.get('DB_USER', 'shop'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'Shop.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+            'OPTIONS': {
+                # Сколько секунд ждать снятия блокировки записи, прежде чем вернуть database is locked
+                'timeout': 20,
+            },
+        }
+    }
+
+# Применяются к каждому новому соединению SQLite (app.signals.configure_sqlite_connection)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def _cache(name, env, max_entries, timeout=300):
+    # Каждый кэш задается переменными <env>_CACHE_BACKEND/LOCATION/MAX_ENTRIES, общий для всех —
+    # CACHE_BACKEND/CACHE_LOCATION; ключи разных кэшей на одном сервере разделяет KEY_PREFIX
+    backend = os.environ.get(f'{env}_CACHE_BACKEND', os.environ.get('CACHE_BACKEND', LOCMEM_CACHE))
+    config = {
+        'BACKEND': backend,
+        'LOCATION': os.environ.get(f'{env}_CACHE_LOCATION', os.environ.get('CACHE_LOCATION', name)),
+        'TIMEOUT': timeout,
+        'KEY_PREFIX': name,
     }
+    # Число записей ограничивают только кэши в памяти процесса, в файлах и в БД; при переполнении
+    # они выбрасывают треть записей без разбора, поэтому размер задается под каждую задачу
+    if backend.rsplit('.', 2)[-2] in ('locmem', 'filebased', 'db'):
+        config['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get(f'{env}_CACHE_MAX_ENTRIES', max_entries))}
+    return config
+
+
+CACHES = {
+    'default': {
+        'BACKEND': LOCMEM_CACHE,
+    },
+    'fragments': _cache('fragments', 'FRAGMENT', 20000, None),
+    'summaries': _cache('summaries', 'USER_SUMMARY', 20000),
+    'throttle': _cache('throttle', 'THROTTLE', 100000),
+    'sessions': _cache('sessions', 'SESSION', 20000, 60 * 60 * 24 * 14),
+    'users': _cache('users', 'USER', 20000),
+    'query_stats': _cache('query_stats', 'QUERY_STATS', 1000, None),
+}
+# locmem живет внутри процесса: при нескольких воркерах сброс версии фрагментов, счетчики и записи
+# остаются в том процессе, где изменились. Эти кэши на проде должны быть общими (memcached и т.п.),
+# manage.py check --deploy сообщает об ошибке, если какой-то из них в locmem
+SHARED_CACHE_ALIASES = ['fragments', 'summaries', 'throttle', 'sessions', 'users', 'query_stats']
+# Сессии: cached_db (по умолчанию) читает из кэша и пишет сквозь него в БД, cache хранит только в кэше,
+# signed_cookies — в подписанной cookie без обращения к серверу, db — стандартное хранение в таблице
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_BACKEND', 'cached_db')
+SESSION_CACHE_ALIAS = 'sessions'
+FRAGMENT_CACHE_ALIAS = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Сводка корзины и избранного для шапки. Запись сбрасывается в процессе, где изменилась корзина;
+# если кэш не общий, остальные воркеры показывают старые значения не дольше USER_SUMMARY_TIMEOUT
+USER_SUMMARY_CACHE_ALIAS = 'summaries'
+USER_SUMMARY_TIMEOUT = 10 * 60
+# Объект пользователя для request.user (users.backends.CachedModelBackend). Запись сбрасывается при
+# сохранении пользователя только в своем процессе: если кэш не общий, смена пароля или is_active
+# доходит до остальных воркеров через USER_CACHE_TIMEOUT. ModelBackend оставлен для сессий,
+# созданных до кэширующего бэкенда; пароли проверяет только CachedModelBackend
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend', 'django.contrib.auth.backends.ModelBackend']
+USER_CACHE_ALIAS = 'users'
+USER_CACHE_TIMEOUT = 60
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_CACHE_MAX_AGE = 60
+
+# Таблицы меньше этого размера в админке считаются точным COUNT(*), а не оценкой из статистики СУБД
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Асинхронные страницы каталога (app.async_views); имеет смысл только при запуске под ASGI
+ASYNC_CATALOG_VIEWS = os.environ.get('ASYNC_CATALOG_VIEWS') == '1'
+# Потоков для запросов к БД из асинхронных страниц; у каждого потока свое соединение
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 16))
+
+# Профиль хэширования паролей: pbkdf2 (по умолчанию) или argon2 (нужен пакет argon2-cffi).
+# Хэши остальных алгоритмов из списка продолжают проверяться и пересчитываются при входе
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 216000))
+# Память argon2 в КиБ: 19 МиБ при одном потоке — рекомендация OWASP, предсказуемая нагрузка на воркер
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'users.hashers.TunedPBKDF2PasswordHasher',
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Ограничение попыток входа и регистрации: {scope: (попыток, окно в секундах)}.
+# Проверка идет до хэширования пароля. В locmem у каждого воркера свои счетчики и лимит фактически
+# умножается на число процессов, поэтому без DEBUG приложение с таким кэшем не запускается
+THROTTLE_CACHE_ALIAS = 'throttle'
+# За прокси адрес клиента берется из его заголовка, например HTTP_X_REAL_IP
+THROTTLE_CLIENT_IP_HEADER = os.environ.get('THROTTLE_CLIENT_IP_HEADER', 'REMOTE_ADDR')
+LOGIN_THROTTLE = {
+    'ip': (int(os.environ.get('LOGIN_THROTTLE_IP', 30)), 5 * 60),
+    'username': (int(os.environ.get('LOGIN_THROTTLE_USERNAME', 5)), 15 * 60),
+}
+REGISTRATION_THROTTLE = {
+    'ip': (int(os.environ.get('REGISTRATION_THROTTLE_IP', 5)), 60 * 60),
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,6 +237,41 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'shop@jumanji.local')
+ADMINS = [('Jumanji', os.environ.get('ADMIN_EMAIL', 'admin@jumanji.local'))]
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30
+# Задача, которая выполняется дольше, считается брошенной (воркер упал) и снова попадает в очередь;
+# значение должно быть больше времени самой долгой задачи
+TASK_LEASE_TIMEOUT = 10 * 60
+# Выполненные задачи хранятся для разбора в админке, затем воркер их удаляет
+TASK_DONE_RETENTION = 24 * 60 * 60
+CART_RESERVATION_TTL = 30 * 60
+REPORT_BATCH_SIZE = 5000
+# Строки моложе этой задержки в дневную статистику пока не берутся
+REPORT_SETTLE_DELAY = 5
+REPORT_DEFAULT_DAYS = 30
+REPORT_ROWS_LIMIT = 100
+# Рекомендации: соседей на продукт, вес пары из избранного относительно пары из заказа,
+# предел размера корзины, число последних купленных продуктов для персональной подборки
+RECOMMENDATION_NEIGHBOURS = 10
+RECOMMENDATION_FAVORITE_WEIGHT = 0.5
+RECOMMENDATION_MAX_BASKET = 50
+RECOMMENDATION_SEEDS = 20
+RECOMMENDATIONS_ON_HOME = 6
+
 PRODUCT_IMAGE_DIR = 'products_images'
 COMPANY_IMAGE_DIR = 'company_images'
+RELATED_PRODUCTS_LIMIT = 4
+# Сколько лучших товаров хранить в сводках компаний и категорий
+CATALOG_SUMMARY_TOP = 5
+THUMBNAIL_SIZES = {
+    'card': (300, 160),
+    'small': (200, 120),
+    'logo': (200, 100),
+}
+THUMBNAIL_QUALITY = 82
+PRODUCT_THUMBNAILS = ['card', 'small']
+COMPANY_THUMBNAILS = ['logo']
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
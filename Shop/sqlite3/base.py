@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Транзакция сразу берет блокировку записи. При обычном BEGIN транзакция, которая сначала читает,
+    # а потом пишет, не может повысить блокировку при конкурентной записи и падает с database is locked,
+    # не дожидаясь busy timeout
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,10 +1,26 @@
-from django.contrib import admin
+from datetime import timedelta
+from urllib.parse import urlencode
 
-from .models import Product, Category, Review, Company, Speciality, Cart, CartProduct, Favorites, FavoriteProduct, Order
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .admin_tools import PerformanceModelAdmin, ReadOnlyModelAdmin, input_filter
+from .catalog_io import RowWriter
+from .forms import ReportForm
+from .models import (
+    Product, Category, Review, Company, Speciality, Cart, CartProduct, FavoriteProduct, Order, OrderLine,
+    Task, CompanySummary, CategorySummary, DailyStat, ProductNeighbour,
+)
+from .reports import REPORT_FIELDS, report_rows, report_totals
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(PerformanceModelAdmin):
     list_display = (
         'id',
         'title',
@@ -14,26 +30,42 @@ class ProductAdmin(admin.ModelAdmin):
         'description',
         'category',
         'availability',
+        'stock',
+        'reserved',
+    )
+    list_filter = (
+        'availability',
+        input_filter('brand__title', 'бренду'),
+        input_filter('category__title', 'категории'),
     )
-    list_filter = ('brand', 'category', 'availability')
+    list_select_related = ('brand', 'category')
+    search_fields = ('title',)
+    autocomplete_fields = ('brand', 'category')
     raw_id_fields = ('review',)
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'title')
+    search_fields = ('title',)
+    autocomplete_fields = ('brand',)
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(PerformanceModelAdmin):
     list_display = ('id', 'owner', 'stars', 'text', 'product')
-    list_filter = ('owner', 'product')
+    list_filter = ('stars', input_filter('owner__username', 'пользователю'), input_filter('product_id', 'id продукта'))
+    list_select_related = ('owner', 'product')
+    autocomplete_fields = ('owner', 'product')
 
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'owner', 'logo', 'speciality')
-    list_filter = ('owner', 'speciality')
+    list_filter = ('speciality', input_filter('owner__username', 'владельцу'))
+    list_select_related = ('owner', 'speciality')
+    search_fields = ('title',)
+    autocomplete_fields = ('owner',)
 
 
 @admin.register(Speciality)
@@ -42,7 +74,7 @@ class SpecialityAdmin(admin.ModelAdmin):
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(PerformanceModelAdmin):
     list_display = (
         'id',
         'owner',
@@ -51,31 +83,42 @@ class CartAdmin(admin.ModelAdmin):
         'anon',
         'in_order',
     )
-    list_filter = ('owner', 'anon', 'in_order')
-    raw_id_fields = ('products',)
+    list_filter = ('anon', 'in_order', input_filter('owner__username', 'владельцу'))
+    list_select_related = ('owner',)
+    autocomplete_fields = ('owner',)
 
 
 @admin.register(CartProduct)
-class CartProductAdmin(admin.ModelAdmin):
+class CartProductAdmin(PerformanceModelAdmin):
     list_display = ('id', 'product', 'qty', 'cart', 'final_price', 'user')
-    list_filter = ('product', 'cart', 'user')
-
-
-@admin.register(Favorites)
-class FavoritesAdmin(admin.ModelAdmin):
-    list_display = ('id', 'owner')
-    list_filter = ('owner',)
-    raw_id_fields = ('products',)
+    list_filter = (
+        input_filter('user__username', 'пользователю'),
+        input_filter('cart_id', 'id корзины'),
+        input_filter('product_id', 'id продукта'),
+    )
+    list_select_related = ('product', 'cart__owner', 'user')
+    autocomplete_fields = ('product', 'user')
+    raw_id_fields = ('cart',)
 
 
 @admin.register(FavoriteProduct)
-class FavoriteProductAdmin(admin.ModelAdmin):
+class FavoriteProductAdmin(PerformanceModelAdmin):
     list_display = ('id', 'product', 'owner')
-    list_filter = ('product', 'owner')
+    list_filter = (input_filter('owner__username', 'владельцу'), input_filter('product_id', 'id продукта'))
+    list_select_related = ('product', 'owner')
+    autocomplete_fields = ('product', 'owner')
+
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    readonly_fields = ('product', 'title', 'price', 'qty', 'final_price')
+    can_delete = False
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(PerformanceModelAdmin):
+    inlines = (OrderLineInline,)
     list_display = (
         'id',
         'first_name',
@@ -88,5 +131,92 @@ class OrderAdmin(admin.ModelAdmin):
         'published_at',
         'cart',
         'owner',
+        'final_quantity',
+        'final_price',
     )
-    list_filter = ('date_at', 'published_at', 'cart', 'owner')
+    list_filter = ('date_at', input_filter('owner__username', 'владельцу'), input_filter('cart_id', 'id корзины'))
+    list_select_related = ('cart__owner', 'owner')
+    date_hierarchy = 'published_at'
+    autocomplete_fields = ('owner',)
+    raw_id_fields = ('cart',)
+
+
+@admin.register(Task)
+class TaskAdmin(PerformanceModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'started_at', 'created_at')
+    list_filter = ('status', 'name')
+
+
+class CatalogSummaryAdmin(ReadOnlyModelAdmin):
+    list_display = ('product_count', 'in_stock_count', 'price_min', 'price_max', 'rating_avg', 'updated_at')
+
+
+@admin.register(CompanySummary)
+class CompanySummaryAdmin(CatalogSummaryAdmin):
+    list_display = ('company',) + CatalogSummaryAdmin.list_display
+    list_select_related = ('company',)
+
+
+@admin.register(CategorySummary)
+class CategorySummaryAdmin(CatalogSummaryAdmin):
+    list_display = ('category',) + CatalogSummaryAdmin.list_display
+    list_select_related = ('category',)
+
+
+@admin.register(DailyStat)
+class DailyStatAdmin(ReadOnlyModelAdmin):
+    list_display = ('day', 'dimension', 'title', 'revenue', 'units', 'review_count', 'stars_sum')
+    list_filter = ('dimension', input_filter('key', 'id объекта'))
+    date_hierarchy = 'day'
+    change_list_template = 'admin/app/dailystat/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('report/', self.admin_site.admin_view(self.report_view), name='app_dailystat_report'),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        today = timezone.localdate()
+        form = ReportForm(request.GET or {
+            'dimension': DailyStat.BRAND,
+            'ordering': 'revenue',
+            'date_from': today - timedelta(days=settings.REPORT_DEFAULT_DAYS - 1),
+            'date_to': today,
+        })
+        rows = totals = None
+        if form.is_valid():
+            data = form.cleaned_data
+            period = (data['dimension'], data['date_from'], data['date_to'])
+            if request.GET.get('format') == 'csv':
+                return self.report_csv(report_rows(*period, ordering=data['ordering']), data)
+            rows = report_rows(*period, ordering=data['ordering'], limit=settings.REPORT_ROWS_LIMIT)
+            totals = report_totals(*period)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Отчет по продажам и отзывам',
+            'form': form,
+            'rows': rows,
+            'totals': totals,
+            'csv_query': urlencode({**dict(form.data.items()), 'format': 'csv'}),
+        }
+        return TemplateResponse(request, 'admin/app/dailystat/report.html', context)
+
+    def report_csv(self, rows, data):
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment; filename="report-{data["dimension"]}-{data["date_from"]}-{data["date_to"]}.csv"'
+        )
+        writer = RowWriter(response, 'csv', REPORT_FIELDS)
+        for row in rows:
+            writer.write(row)
+        return response
+
+
+@admin.register(ProductNeighbour)
+class ProductNeighbourAdmin(ReadOnlyModelAdmin):
+    list_display = ('product', 'rank', 'neighbour', 'score')
+    list_filter = (input_filter('product_id', 'id продукта'),)
+    list_select_related = ('product', 'neighbour')
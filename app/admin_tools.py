@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    # Оценка числа строк из статистики СУБД; None, если оценки нет и нужен честный COUNT(*)
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 появляется после ANALYZE; первое число в stat — количество строк
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    # Для списка без фильтров COUNT(*) по большой таблице заменяется оценкой из статистики;
+    # отфильтрованные списки и небольшие таблицы считаются точно
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    # Фильтр с полем ввода вместо списка всех связанных объектов в боковой панели
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        # Значение набрано вручную: неверное (буквы вместо id) дает сообщение админки, а не 500
+        field = get_fields_from_path(queryset.model, self.lookup)[-1]
+        try:
+            return queryset.filter(**{self.lookup: field.to_python(value.strip())})
+        except (ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error)
+
+    def choices(self, changelist):
+        query_parts = [
+            (key, value) for key, value in changelist.params.items()
+            if key not in (self.parameter_name, 'p')
+        ]
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': query_parts,
+        }
+
+
+def input_filter(lookup, title):
+    return type('InputFilter', (InputFilter,), {
+        'lookup': lookup,
+        'parameter_name': lookup,
+        'title': title,
+    })
+
+
+class PerformanceModelAdmin(admin.ModelAdmin):
+    # Базовый класс для таблиц, которые растут без ограничений (корзины, заказы, отзывы)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class ReadOnlyModelAdmin(PerformanceModelAdmin):
+    # Для таблиц, которые заполняются автоматически (сводки, статистика) и вручную не правятся
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,186 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.generic.base import View
+
+from app.models import Product, Category, Company, Review, CatalogVersion
+from app.pagination import KeysetPaginator
+
+
+def catalog_version(resource):
+    # Версия из базы, а не из кэша: все воркеры видят одно и то же значение сразу после коммита
+    return CatalogVersion.objects.filter(resource=resource).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version(*resources):
+    # Вызывается при изменении данных, которые отдают ресурсы API resources
+    for resource in resources:
+        if not CatalogVersion.objects.filter(resource=resource).update(version=F('version') + 1):
+            CatalogVersion.objects.get_or_create(resource=resource, defaults={'version': 1})
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiView(View):
+    http_method_names = ['get', 'head']
+    queryset = None
+    # Ресурс CatalogVersion, по версии которого строится ETag
+    resource = None
+    # Имя поля в ответе -> имя для .values()
+    fields = {}
+    default_fields = ()
+    image_fields = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        # Ответ полностью определяется версией ресурса и адресом запроса, поэтому ETag считается
+        # одним запросом по уникальному индексу, и 304 отдается без выборки самих данных
+        version = catalog_version(self.resource)
+        digest = hashlib.sha1(f'{self.resource}:{version}:{request.get_full_path()}'.encode()).hexdigest()
+        etag = quote_etag(digest)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            except ApiError as error:
+                response = JsonResponse({'error': str(error)}, status=error.status)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, max_age=settings.API_CACHE_MAX_AGE)
+        return response
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.default_fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+        return names
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def serialize(self, rows, names):
+        result = []
+        for row in rows:
+            item = {name: row[self.fields[name]] for name in names}
+            for name in self.image_fields:
+                if item.get(name):
+                    item[name] = default_storage.url(item[name])
+            result.append(item)
+        return result
+
+
+class ApiListView(ApiView):
+    ordering = ('id',)
+
+    def get_limit(self):
+        limit = self.request.GET.get('limit', '')
+        if not limit.isdigit() or not int(limit):
+            return settings.API_PAGE_SIZE
+        return min(int(limit), settings.API_MAX_PAGE_SIZE)
+
+    def get(self, request, *args, **kwargs):
+        names = self.get_fields()
+        # Поля сортировки нужны для курсора, даже если клиент их не запросил
+        columns = {self.fields[name] for name in names} | {field.lstrip('-') for field in self.ordering}
+        queryset = self.get_queryset().values(*columns)
+        page = KeysetPaginator(queryset, self.ordering, self.get_limit()).get_page(request.GET.get('cursor'))
+        return JsonResponse({
+            'results': self.serialize(page, names),
+            'next': page.next_cursor,
+        }, json_dumps_params={'ensure_ascii': False})
+
+
+class ApiDetailView(ApiView):
+    def get(self, request, *args, **kwargs):
+        names = self.get_fields()
+        row = self.get_queryset().filter(pk=kwargs['pk']).values(*{self.fields[name] for name in names}).first()
+        if row is None:
+            raise ApiError('Не найдено', status=404)
+        return JsonResponse(self.serialize([row], names)[0], json_dumps_params={'ensure_ascii': False})
+
+
+class ProductApiMixin:
+    queryset = Product.objects.all()
+    resource = CatalogVersion.PRODUCTS
+    fields = {
+        'id': 'id',
+        'title': 'title',
+        'description': 'description',
+        'price': 'price',
+        'image': 'image',
+        'brand': 'brand_id',
+        'category': 'category_id',
+        'rating_avg': 'rating_avg',
+        'rating_count': 'rating_count',
+    }
+    default_fields = ('id', 'title', 'price', 'image', 'brand', 'category', 'rating_avg')
+    image_fields = ('image',)
+
+
+class ProductListApi(ProductApiMixin, ApiListView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for param, field in (('category', 'category_id'), ('brand', 'brand_id')):
+            value = self.request.GET.get(param, '')
+            if value.isdigit():
+                queryset = queryset.filter(**{field: int(value)})
+        return queryset
+
+
+class ProductDetailApi(ProductApiMixin, ApiDetailView):
+    pass
+
+
+class CategoryApiMixin:
+    queryset = Category.objects.all()
+    resource = CatalogVersion.CATEGORIES
+    fields = {'id': 'id', 'title': 'title'}
+    default_fields = ('id', 'title')
+
+
+class CategoryListApi(CategoryApiMixin, ApiListView):
+    pass
+
+
+class CategoryDetailApi(CategoryApiMixin, ApiDetailView):
+    pass
+
+
+class CompanyApiMixin:
+    queryset = Company.objects.all()
+    resource = CatalogVersion.COMPANIES
+    fields = {'id': 'id', 'title': 'title', 'logo': 'logo', 'speciality': 'speciality__title'}
+    default_fields = ('id', 'title', 'logo')
+    image_fields = ('logo',)
+
+
+class CompanyListApi(CompanyApiMixin, ApiListView):
+    pass
+
+
+class CompanyDetailApi(CompanyApiMixin, ApiDetailView):
+    pass
+
+
+class ReviewListApi(ApiListView):
+    queryset = Review.objects.all()
+    resource = CatalogVersion.REVIEWS
+    # Как и на страницах, показывается имя, а не логин: список логинов не должен утекать через открытое API
+    fields = {'id': 'id', 'author': 'owner__first_name', 'stars': 'stars', 'text': 'text'}
+    default_fields = ('id', 'author', 'stars', 'text')
+    ordering = ('-id',)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(product_id=self.kwargs['pk'])
@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import close_old_connections, connection
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.functional import SimpleLazyObject
+
+from app.favorites import favorite_ids
+from app.forms import ReviewForm
+from app.models import Product, Review, Category, Company
+from app.pagination import keyset_page_urls
+from app.query_stats import current_recorder
+from app.recommendations import bought_together, recommended_for
+from app.utils import related_products
+from app.views import CategoryDetailView, DetailProductView, category_products_page
+
+# Асинхронные версии страниц каталога для запуска под ASGI (ASYNC_CATALOG_VIEWS = True).
+# ORM и кэш в Django 3.1 синхронные, поэтому каждый независимый запрос уходит в отдельный поток пула
+# со своим соединением, а asyncio.gather ждет их одновременно. Данные кэшируемых фрагментов передаются
+# в шаблон ленивыми, как и в синхронных представлениях: они запрашиваются при рендеринге, только если
+# фрагмента нет в кэше. Проверка кэша заранее ошибалась бы, если фрагмент вытеснен до рендеринга.
+# Middleware проекта синхронные, поэтому каждый запрос все равно проходит через поток-адаптер; замеры
+# (README, «Запуск под ASGI») прироста пропускной способности пока не показывают.
+
+# Свой постоянный пул, а не executor цикла событий: asgiref может выполнять представление во временном
+# цикле, и тогда каждый запрос получал бы новые потоки и новые соединения с БД
+_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_VIEW_THREADS, thread_name_prefix='async-views')
+
+
+def _in_thread(func, *args, **kwargs):
+    recorder = current_recorder.get()
+
+    def call():
+        close_old_connections()
+        try:
+            with connection.execute_wrapper(recorder) if recorder else contextlib.nullcontext():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(_executor, context.run, call)
+
+
+async def _nothing():
+    return None
+
+
+def _first(queryset):
+    return queryset.first()
+
+
+async def _get_or_404(queryset):
+    obj = await _in_thread(_first, queryset)
+    if obj is None:
+        raise Http404
+    return obj
+
+
+async def _resolve_user(request):
+    # request.user ленивый; вычисляем его один раз, до того как он понадобится нескольким потокам
+    await _in_thread(lambda: request.user.is_authenticated)
+    return request.user
+
+
+async def _render(request, template_name, context):
+    return await _in_thread(render, request, template_name, context)
+
+
+async def main_view(request):
+    user = await _resolve_user(request)
+    products, favorites, recommended = await asyncio.gather(
+        _in_thread(list, Product.objects.filter(availability=True).order_by('-pk')[:6]),
+        _in_thread(favorite_ids, user),
+        _in_thread(recommended_for, user),
+    )
+    context = {'products': products, 'favorite_ids': favorites, 'recommended_products': recommended}
+    return await _render(request, 'main/index.html', context)
+
+
+async def catalog_view(request):
+    context = {
+        'companies': SimpleLazyObject(lambda: list(Company.objects.select_related('summary'))),
+        'categories': SimpleLazyObject(lambda: list(Category.objects.select_related('summary'))),
+    }
+    return await _render(request, 'main/catalog.html', context)
+
+
+async def detail_company_view(request, pk):
+    # Страница компании целиком строится из одной строки со сводкой
+    company = await _get_or_404(Company.objects.select_related('summary').filter(pk=pk))
+    summary = getattr(company, 'summary', None)
+    categories = summary.categories if summary else await _in_thread(list, Category.objects.filter(brand=pk))
+    context = {'company': company, 'categories': categories, 'summary': summary}
+    return await _render(request, 'main/detail_company.html', context)
+
+
+async def category_detail_view(request, pk):
+    user = await _resolve_user(request)
+    category, (filter_form, page), favorites = await asyncio.gather(
+        _get_or_404(Category.objects.filter(pk=pk)),
+        _in_thread(category_products_page, request, pk, CategoryDetailView.products_per_page),
+        _in_thread(favorite_ids, user),
+    )
+    context = {
+        'category': category,
+        'categories': SimpleLazyObject(lambda: list(Category.objects.order_by('title'))),
+        'products': page,
+        'filter_form': filter_form,
+        **keyset_page_urls(request, page),
+        'favorite_ids': favorites,
+    }
+    return await _render(request, 'main/detail_category.html', context)
+
+
+def _reviews_page(product_id, page_number, per_page):
+    reviews = Review.objects.filter(product_id=product_id).select_related('owner').order_by('-pk')
+    page = Paginator(reviews, per_page).get_page(page_number)
+    page.object_list = list(page.object_list)
+    return page
+
+
+async def detail_product_view(request, pk):
+    if request.method != 'GET':
+        # Отзыв — запись; она остается в синхронном представлении
+        return await sync_to_async(DetailProductView.as_view())(request, pk=pk)
+    user = await _resolve_user(request)
+    page_number = request.GET.get('page')
+    product = await _get_or_404(Product.objects.filter(pk=pk))
+    related, review = await asyncio.gather(
+        _in_thread(related_products, product),
+        _in_thread(_first, Review.objects.filter(product_id=pk, owner=user)) if user.is_authenticated
+        else _nothing(),
+    )
+    context = {
+        'product': product,
+        'related_products': related,
+        'bought_together': SimpleLazyObject(lambda: bought_together(pk)),
+        'rate': product.rating_avg,
+        'reviews': SimpleLazyObject(lambda: _reviews_page(pk, page_number, DetailProductView.reviews_per_page)),
+        'form': ReviewForm(instance=review) if review else ReviewForm,
+    }
+    return await _render(request, 'main/detail_product.html', context)
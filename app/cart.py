@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+
+from app.inventory import OutOfStock, reserve
+from app.models import Cart, CartProduct, Product
+from app.utils import apply_cart_delta
+
+SESSION_CART_KEY = 'cart'
+
+
+# Корзина анонимного пользователя живет в сессии и попадает в БД только после входа
+class SessionCart:
+    anon = True
+
+    def __init__(self, session):
+        self.session = session
+        self.lines = session.get(SESSION_CART_KEY, {})
+
+    def add(self, product, qty=1):
+        key = str(product.pk)
+        self.lines[key] = self.lines.get(key, 0) + qty
+        self.save()
+
+    def clear(self):
+        self.lines = {}
+        self.session.pop(SESSION_CART_KEY, None)
+
+    def save(self):
+        self.session[SESSION_CART_KEY] = self.lines
+        self.session.modified = True
+
+    @property
+    def final_quantity(self):
+        return sum(self.lines.values())
+
+    @property
+    def final_price(self):
+        products = Product.objects.filter(pk__in=self.lines).only('price')
+        return sum((product.price * self.lines[str(product.pk)] for product in products), Decimal(0))
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def get_user_cart(user):
+    try:
+        return Cart.objects.get(owner=user, in_order=False)
+    except ObjectDoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            return Cart.objects.create(owner=user)
+    except IntegrityError:
+        # Параллельный запрос успел создать открытую корзину первым
+        return Cart.objects.get(owner=user, in_order=False)
+
+
+def _per_product(quantities, value, output_field):
+    if len(quantities) == 1:
+        product, qty = next(iter(quantities.items()))
+        return Value(value(product, qty), output_field=output_field)
+    return Case(
+        *[When(product_id=product.pk, then=Value(value(product, qty))) for product, qty in quantities.items()],
+        output_field=output_field,
+    )
+
+
+def add_to_cart(cart, user, quantities):
+    # quantities: {Product: кол-во}. Строки корзины уникальны по (cart, product), поэтому добавление —
+    # это INSERT ... ON CONFLICT DO NOTHING и один UPDATE qty = qty + n, без чтения строк и без гонок
+    quantities = {product: qty for product, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    with transaction.atomic():
+        reserve(cart, quantities)
+        CartProduct.objects.bulk_create(
+            [CartProduct(cart=cart, product=product, user=user, qty=0, final_price=0) for product in quantities],
+            ignore_conflicts=True,
+        )
+        CartProduct.objects.filter(cart=cart, product__in=list(quantities)).update(
+            qty=F('qty') + _per_product(quantities, lambda product, qty: qty, models.PositiveIntegerField()),
+            final_price=F('final_price') + _per_product(
+                quantities, lambda product, qty: product.price * qty,
+                models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+        apply_cart_delta(
+            cart,
+            sum(quantities.values()),
+            sum((product.price * qty for product, qty in quantities.items()), Decimal(0)),
+        )
+
+
+def merge_session_cart(session, user):
+    session_cart = SessionCart(session)
+    if not session_cart:
+        return
+    cart = get_user_cart(user)
+    for product in Product.objects.filter(pk__in=session_cart.lines):
+        try:
+            add_to_cart(cart, user, {product: session_cart.lines[str(product.pk)]})
+        except OutOfStock:
+            continue
+    session_cart.clear()
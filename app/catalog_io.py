@@ -0,0 +1,267 @@
+import csv
+import contextlib
+import json
+import os
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from app.models import Product, Company, Category, Speciality, User, in_stock_expression
+
+FORMATS = ('csv', 'jsonl')
+# Внутри одной ячейки CSV список брендов категории пишется через этот разделитель
+LIST_SEPARATOR = '|'
+
+FIELDS = {
+    'products': ['id', 'title', 'description', 'price', 'stock', 'image', 'brand', 'category'],
+    'companies': ['id', 'title', 'owner', 'logo', 'speciality'],
+    'categories': ['id', 'title', 'brands'],
+}
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return extension if extension in FORMATS else 'csv'
+
+
+def open_stream(path, mode):
+    # stdin/stdout оборачиваются, чтобы with не закрывал их
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def read_rows(stream, fmt):
+    # Файл читается построчно, поэтому память не зависит от его размера
+    if fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(stream)
+
+
+class RowWriter:
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        self.fields = fields
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=fields)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        else:
+            self.writer.writerow(row)
+
+
+def _text(row, field, required=True):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'не заполнено поле {field}')
+    return value
+
+
+def _number(row, field, cast, default=None):
+    value = _text(row, field, required=default is None)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except (ValueError, InvalidOperation):
+        raise RowError(f'неверное значение {field}: {value}')
+
+
+def _id(row):
+    value = _text(row, 'id', required=False)
+    if value and not value.isdigit():
+        raise RowError(f'неверное значение id: {value}')
+    return int(value) if value else None
+
+
+class Importer:
+    model = None
+    fields = ()
+
+    def __init__(self):
+        self.created = self.updated = 0
+
+    def prepare(self, rows):
+        pass
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def save(self, objects):
+        with transaction.atomic():
+            existing = set(self.model.objects.filter(
+                pk__in=[obj.pk for obj in objects if obj.pk]
+            ).values_list('pk', flat=True))
+            to_update = [obj for obj in objects if obj.pk in existing]
+            to_create = [obj for obj in objects if obj.pk not in existing]
+            if to_update:
+                self.model.objects.bulk_update(to_update, self.fields)
+            if to_create:
+                self.create(to_create)
+            self.after_batch(to_create, to_update)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def create(self, objects):
+        self.model.objects.bulk_create(objects)
+
+    def after_batch(self, created, updated):
+        pass
+
+
+class CategoryMap:
+    # Справочник «название -> id»; недостающие простые записи создаются по ходу импорта
+    def __init__(self, model):
+        self.model = model
+        self.ids = dict(model.objects.values_list('title', 'pk'))
+
+    def get_or_create(self, title):
+        if title not in self.ids:
+            self.ids[title] = self.model.objects.create(title=title).pk
+        return self.ids[title]
+
+
+class ProductImporter(Importer):
+    model = Product
+    fields = ('title', 'description', 'price', 'stock', 'image', 'brand', 'category')
+
+    def __init__(self):
+        super().__init__()
+        self.companies = dict(Company.objects.values_list('title', 'pk'))
+        self.categories = CategoryMap(Category)
+
+    def build(self, row):
+        brand = _text(row, 'brand')
+        if brand not in self.companies:
+            raise RowError(f'неизвестный бренд {brand}')
+        stock = _number(row, 'stock', int, default=0)
+        if stock < 0:
+            raise RowError('остаток не может быть отрицательным')
+        return Product(
+            pk=_id(row),
+            title=_text(row, 'title')[:30],
+            description=_text(row, 'description', required=False),
+            price=_number(row, 'price', Decimal),
+            stock=stock,
+            # bulk_create не вызывает save(), поэтому признак наличия проставляется здесь
+            availability=stock > 0,
+            image=_text(row, 'image', required=False),
+            brand_id=self.companies[brand],
+            category_id=self.categories.get_or_create(_text(row, 'category')),
+        )
+
+    def after_batch(self, created, updated):
+        if updated:
+            # У обновленных товаров мог быть резерв, поэтому наличие считается в базе от stock и reserved
+            Product.objects.filter(pk__in=[obj.pk for obj in updated]).update(availability=in_stock_expression())
+
+
+class CompanyImporter(Importer):
+    model = Company
+    fields = ('title', 'owner', 'logo', 'speciality')
+
+    def __init__(self):
+        super().__init__()
+        self.specialities = CategoryMap(Speciality)
+
+    def prepare(self, rows):
+        # Владельцы ищутся одним запросом на пачку, а не по одному
+        usernames = {_text(row, 'owner', required=False) for row in rows}
+        self.owners = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+
+    def build(self, row):
+        owner = _text(row, 'owner')
+        if owner not in self.owners:
+            raise RowError(f'неизвестный пользователь {owner}')
+        return Company(
+            pk=_id(row),
+            title=_text(row, 'title')[:30],
+            owner_id=self.owners[owner],
+            logo=_text(row, 'logo', required=False),
+            speciality_id=self.specialities.get_or_create(_text(row, 'speciality')),
+        )
+
+
+class CategoryImporter(Importer):
+    model = Category
+    fields = ('title',)
+
+    def __init__(self):
+        super().__init__()
+        self.companies = dict(Company.objects.values_list('title', 'pk'))
+
+    def build(self, row):
+        category = Category(pk=_id(row), title=_text(row, 'title')[:30])
+        # Без колонки brands связи категории с брендами не трогаются
+        category._brand_ids = None
+        if 'brands' in row:
+            brands = [title.strip() for title in _text(row, 'brands', required=False).split(LIST_SEPARATOR)]
+            brands = [title for title in brands if title]
+            unknown = [title for title in brands if title not in self.companies]
+            if unknown:
+                raise RowError(f'неизвестные бренды {", ".join(unknown)}')
+            category._brand_ids = [self.companies[title] for title in brands]
+        return category
+
+    def create(self, objects):
+        # Для связей с брендами нужен pk, а bulk_create на SQLite его не возвращает. Название не уникально,
+        # поэтому категории без id из файла сохраняются по одной; их немного
+        Category.objects.bulk_create([obj for obj in objects if obj.pk])
+        for obj in objects:
+            if not obj.pk:
+                obj.save(force_insert=True)
+
+    def after_batch(self, created, updated):
+        objects = [obj for obj in created + updated if obj._brand_ids is not None]
+        through = Category.brand.through
+        through.objects.filter(category_id__in=[obj.pk for obj in objects]).delete()
+        through.objects.bulk_create([
+            through(category_id=obj.pk, company_id=company_id) for obj in objects for company_id in obj._brand_ids
+        ])
+
+
+IMPORTERS = {
+    'products': ProductImporter,
+    'companies': CompanyImporter,
+    'categories': CategoryImporter,
+}
+
+
+def _category_rows(chunk_size):
+    brands = {}
+    for category_id, title in Category.brand.through.objects.order_by('company__title').values_list(
+        'category_id', 'company__title'
+    ):
+        brands.setdefault(category_id, []).append(title)
+    for pk, title in Category.objects.order_by('pk').values_list('pk', 'title').iterator(chunk_size):
+        yield pk, title, LIST_SEPARATOR.join(brands.get(pk, []))
+
+
+def export_rows(kind, chunk_size):
+    if kind == 'products':
+        rows = Product.objects.order_by('pk').values_list(
+            'pk', 'title', 'description', 'price', 'stock', 'image', 'brand__title', 'category__title'
+        ).iterator(chunk_size)
+    elif kind == 'companies':
+        rows = Company.objects.order_by('pk').values_list(
+            'pk', 'title', 'owner__username', 'logo', 'speciality__title'
+        ).iterator(chunk_size)
+    else:
+        rows = _category_rows(chunk_size)
+    for values in rows:
+        yield dict(zip(FIELDS[kind], values))
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from app.fragment_cache import invalidate
+from app.models import Product, Company, Category, CompanySummary, CategorySummary
+
+TOP_PRODUCT_FIELDS = ('id', 'title', 'price', 'rating_avg')
+
+
+def _aggregates():
+    return {
+        'product_count': Count('pk'),
+        'in_stock_count': Count('pk', filter=Q(availability=True)),
+        'price_min': Min('price'),
+        'price_max': Max('price'),
+        'rating_sum': Sum('rating_sum'),
+        'rating_count': Sum('rating_count'),
+    }
+
+
+def _summary_fields(row, top_products):
+    rating_count = row['rating_count'] or 0
+    return {
+        'product_count': row['product_count'],
+        'in_stock_count': row['in_stock_count'],
+        'price_min': row['price_min'],
+        'price_max': row['price_max'],
+        # Средняя по всем отзывам, а не по средним товаров: товар с одним отзывом не перевешивает популярные
+        'rating_avg': round(Decimal(row['rating_sum'] or 0) / rating_count, 2) if rating_count else 0,
+        'top_products': top_products,
+    }
+
+
+def _top_products(products):
+    return list(products.order_by('-rating_avg', '-id').values(*TOP_PRODUCT_FIELDS)[:settings.CATALOG_SUMMARY_TOP])
+
+
+def _company_categories(company_ids):
+    categories = {company_id: [] for company_id in company_ids}
+    links = Category.brand.through.objects.filter(company_id__in=company_ids).order_by('category__title')
+    for company_id, category_id, title in links.values_list('company_id', 'category_id', 'category__title'):
+        categories[company_id].append({'id': category_id, 'title': title})
+    return categories
+
+
+def refresh_company_summaries(company_ids):
+    company_ids = set(Company.objects.filter(pk__in=set(company_ids)).values_list('pk', flat=True))
+    if not company_ids:
+        return
+    categories = _company_categories(company_ids)
+    for company_id in company_ids:
+        products = Product.objects.filter(brand_id=company_id)
+        CompanySummary.objects.update_or_create(company_id=company_id, defaults={
+            **_summary_fields(products.aggregate(**_aggregates()), _top_products(products)),
+            'categories': categories[company_id],
+        })
+    invalidate(*[f'company:{company_id}' for company_id in company_ids], 'summaries')
+
+
+def refresh_category_summaries(category_ids):
+    category_ids = set(Category.objects.filter(pk__in=set(category_ids)).values_list('pk', flat=True))
+    if not category_ids:
+        return
+    for category_id in category_ids:
+        products = Product.objects.filter(category_id=category_id)
+        CategorySummary.objects.update_or_create(
+            category_id=category_id,
+            defaults=_summary_fields(products.aggregate(**_aggregates()), _top_products(products)),
+        )
+    invalidate(*[f'category:{category_id}' for category_id in category_ids], 'summaries')
+
+
+def refresh_product_summaries(product_ids):
+    placements = Product.objects.filter(pk__in=product_ids).values_list('brand_id', 'category_id')
+    refresh_company_summaries({brand_id for brand_id, _ in placements})
+    refresh_category_summaries({category_id for _, category_id in placements})
+
+
+def rebuild_catalog_summaries():
+    # Полный пересчет: агрегаты одним GROUP BY на таблицу, лучшие товары — по индексу на каждую группу
+    companies = {row.pop('brand'): row for row in Product.objects.values('brand').annotate(**_aggregates())}
+    categories = {row.pop('category'): row for row in Product.objects.values('category').annotate(**_aggregates())}
+    empty = {**dict.fromkeys(_aggregates(), 0), 'price_min': None, 'price_max': None}
+    company_ids = list(Company.objects.values_list('pk', flat=True))
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    company_categories = _company_categories(company_ids)
+    company_summaries = [
+        CompanySummary(
+            company_id=company_id,
+            categories=company_categories[company_id],
+            **_summary_fields(
+                companies.get(company_id, empty),
+                _top_products(Product.objects.filter(brand_id=company_id)) if company_id in companies else [],
+            ),
+        )
+        for company_id in company_ids
+    ]
+    category_summaries = [
+        CategorySummary(
+            category_id=category_id,
+            **_summary_fields(
+                categories.get(category_id, empty),
+                _top_products(Product.objects.filter(category_id=category_id)) if category_id in categories else [],
+            ),
+        )
+        for category_id in category_ids
+    ]
+    with transaction.atomic():
+        CompanySummary.objects.all().delete()
+        CategorySummary.objects.all().delete()
+        CompanySummary.objects.bulk_create(company_summaries, batch_size=500)
+        CategorySummary.objects.bulk_create(category_summaries, batch_size=500)
+    invalidate('summaries', 'catalog')
+    return len(company_summaries), len(category_summaries)
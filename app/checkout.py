@@ -0,0 +1,49 @@
+from django.db import transaction
+
+from app import inventory
+from app.models import Cart, Order, OrderLine
+from app.summary import invalidate_user_summary
+from app.tasks import enqueue
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def place_order(cart, user, data):
+    with transaction.atomic():
+        locked_cart = Cart.objects.select_for_update().filter(pk=cart.pk, in_order=False).first()
+        if locked_cart is None:
+            raise CheckoutError('Эта корзина уже оформлена')
+        lines = list(locked_cart.products.select_related('product').order_by('product_id'))
+        if not lines:
+            raise CheckoutError('Корзина пуста')
+        try:
+            inventory.commit(locked_cart, lines)
+        except inventory.OutOfStock as error:
+            raise CheckoutError(f'Нет в наличии: {", ".join(product.title for product in error.products)}')
+        order_lines = [
+            OrderLine(
+                product=line.product,
+                title=line.product.title,
+                price=line.product.price,
+                qty=line.qty,
+                final_price=line.product.price * line.qty,
+            )
+            for line in lines
+        ]
+        order = Order.objects.create(
+            **data,
+            owner=user,
+            cart=locked_cart,
+            final_quantity=sum(line.qty for line in order_lines),
+            final_price=sum(line.final_price for line in order_lines),
+        )
+        for line in order_lines:
+            line.order = order
+        OrderLine.objects.bulk_create(order_lines)
+        Cart.objects.filter(pk=locked_cart.pk).update(in_order=True)
+        invalidate_user_summary(locked_cart.owner_id)
+        enqueue('send_order_confirmation', order_id=order.pk)
+        enqueue('notify_admins_about_order', order_id=order.pk)
+    return order
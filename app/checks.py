@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Error(
+            f'Кэш {alias!r} хранится в памяти процесса ({settings.CACHES[alias]["BACKEND"]})',
+            hint=f'Каждый воркер увидит только свои изменения; задайте общий бэкенд в {alias!r}, '
+                 f'например через CACHE_BACKEND и CACHE_LOCATION',
+            id='app.E001',
+        )
+        for alias in settings.SHARED_CACHE_ALIASES
+        if settings.CACHES[alias]['BACKEND'] == settings.LOCMEM_CACHE
+    ]
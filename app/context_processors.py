@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from app.cart import SessionCart
+from app.summary import get_user_summary
+
+
+def _summary(request):
+    if request.user.is_authenticated:
+        return get_user_summary(request.user)
+    # Корзина гостя лежит в сессии: количество берется оттуда, сумму без запроса к товарам не показываем
+    return {
+        'cart_quantity': SessionCart(request.session).final_quantity,
+        'cart_price': None,
+        'favorites_count': 0,
+    }
+
+
+def user_summary(request):
+    return {'user_summary': SimpleLazyObject(lambda: _summary(request))}
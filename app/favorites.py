@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from app.models import FavoriteProduct
+from app.summary import invalidate_user_summary
+
+FAVORITE_IDS_KEY = 'favorite-ids:{user_id}'
+
+
+def _get_cache():
+    return caches[settings.USER_SUMMARY_CACHE_ALIAS]
+
+
+def favorite_ids(user):
+    # Множество id избранных товаров: одна выборка по индексу (owner, product), дальше из кэша
+    if not user.is_authenticated:
+        return frozenset()
+    cache = _get_cache()
+    key = FAVORITE_IDS_KEY.format(user_id=user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(FavoriteProduct.objects.filter(owner=user).values_list('product_id', flat=True))
+        cache.set(key, ids, timeout=settings.USER_SUMMARY_TIMEOUT)
+    return ids
+
+
+def invalidate_favorites(user_id):
+    transaction.on_commit(lambda: _get_cache().delete(FAVORITE_IDS_KEY.format(user_id=user_id)))
+    invalidate_user_summary(user_id)
+
+
+def add_favorites(user, product_ids):
+    FavoriteProduct.objects.bulk_create(
+        [FavoriteProduct(owner=user, product_id=pk) for pk in product_ids], ignore_conflicts=True
+    )
+    invalidate_favorites(user.pk)
+
+
+def remove_favorites(user, product_ids):
+    deleted, _ = FavoriteProduct.objects.filter(owner=user, product_id__in=product_ids).delete()
+    invalidate_favorites(user.pk)
+    return deleted
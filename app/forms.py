@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 from django.forms import ModelForm
 from django import forms
-from app.models import Review, Order
+from app.models import Review, Order, Company, DailyStat
 
 
 class ReviewForm(ModelForm):
@@ -41,9 +41,9 @@ class OrderForm(ModelForm):
 
 
 class ChangeQtyForm(forms.Form):
+    # 0 убирает товар из корзины
     number = forms.IntegerField(
-        min_value=1,
-        required=False,
+        min_value=0,
         label=' ',
         widget=forms.TextInput(
             attrs={
@@ -52,3 +52,64 @@ class ChangeQtyForm(forms.Form):
             },
         )
     )
+
+
+class ProductFilterForm(forms.Form):
+    SORT_CHOICES = [
+        ('newest', 'Сначала новые'),
+        ('price', 'Сначала дешевые'),
+        ('-price', 'Сначала дорогие'),
+        ('rating', 'По рейтингу'),
+    ]
+    SORT_ORDERING = {
+        'newest': ('-pk',),
+        'price': ('price', 'pk'),
+        '-price': ('-price', '-pk'),
+        'rating': ('-rating_avg', '-pk'),
+    }
+
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False, label='Сортировка')
+    brand = forms.ModelChoiceField(queryset=Company.objects.none(), required=False, label='Бренд')
+    price_min = forms.DecimalField(min_value=0, required=False, label='Цена от')
+    price_max = forms.DecimalField(min_value=0, required=False, label='Цена до')
+    available = forms.BooleanField(required=False, label='Только в наличии')
+
+    def __init__(self, *args, brands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if brands is not None:
+            self.fields['brand'].queryset = brands
+
+    def filter_queryset(self, queryset):
+        data = self.cleaned_data
+        if data.get('brand'):
+            queryset = queryset.filter(brand=data['brand'])
+        if data.get('price_min') is not None:
+            queryset = queryset.filter(price__gte=data['price_min'])
+        if data.get('price_max') is not None:
+            queryset = queryset.filter(price__lte=data['price_max'])
+        if data.get('available'):
+            queryset = queryset.filter(availability=True)
+        return queryset
+
+    def get_ordering(self):
+        return self.SORT_ORDERING[self.cleaned_data.get('sort') or 'newest']
+
+
+class ReportForm(forms.Form):
+    ORDERING_CHOICES = [
+        ('revenue', 'По выручке'),
+        ('units', 'По продажам'),
+        ('review_count', 'По числу отзывов'),
+        ('rating_avg', 'По рейтингу'),
+    ]
+
+    dimension = forms.ChoiceField(choices=DailyStat.DIMENSION_CHOICES, initial=DailyStat.BRAND, label='Разрез')
+    date_from = forms.DateField(label='С', widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(label='По', widget=forms.DateInput(attrs={'type': 'date'}))
+    ordering = forms.ChoiceField(choices=ORDERING_CHOICES, initial='revenue', label='Сортировка')
+
+    def clean(self):
+        data = super().clean()
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise forms.ValidationError('Начало периода позже его конца')
+        return data
@@ -0,0 +1,112 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+STATS_KEY = 'fragment-stats:{outcome}:{name}'
+# Имена фрагментов со статистикой: счетчик имен и по ключу на каждое имя
+STATS_NAMES_KEY = 'fragment-stats:names'
+STATS_NAME_KEY = 'fragment-stats:name:{index}'
+STATS_REGISTERED_KEY = 'fragment-stats:registered:{name}'
+
+
+def get_cache():
+    return caches[settings.FRAGMENT_CACHE_ALIAS]
+
+
+def scope_for(value):
+    meta = getattr(value, '_meta', None)
+    if meta is not None:
+        return f'{meta.model_name}:{value.pk}'
+    return str(value)
+
+
+def _version_key(scope):
+    return f'fragment-version:{scope}'
+
+
+def _new_version():
+    # Версия берется из часов, а не из счетчика: если ключ версии вытеснен из кэша,
+    # новая версия все равно не совпадет ни с одной старой
+    return time.time_ns()
+
+
+def get_versions(scopes):
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*scopes):
+    get_cache().set_many({_version_key(scope): _new_version() for scope in scopes}, timeout=None)
+
+
+def fragment_key(name, scopes, vary=()):
+    versions = get_versions(scopes)
+    digest = hashlib.md5(repr((scopes, versions, vary)).encode()).hexdigest()
+    return f'fragment:{name}:{digest}'
+
+
+def _register(cache, name):
+    # Имя пишется в свою ячейку под номером из атомарного счетчика, а не в общее множество:
+    # при чтении и записи множества параллельные процессы затирали бы имена друг друга
+    if cache.add(STATS_REGISTERED_KEY.format(name=name), True, timeout=None):
+        cache.add(STATS_NAMES_KEY, 0, timeout=None)
+        index = cache.incr(STATS_NAMES_KEY)
+        cache.set(STATS_NAME_KEY.format(index=index), name, timeout=None)
+
+
+def _names(cache):
+    keys = [STATS_NAME_KEY.format(index=index) for index in range(1, cache.get(STATS_NAMES_KEY, 0) + 1)]
+    return set(cache.get_many(keys).values())
+
+
+def record(name, outcome):
+    cache = get_cache()
+    key = STATS_KEY.format(outcome=outcome, name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+        _register(cache, name)
+
+
+def get_or_render(name, scopes, vary, render):
+    cache = get_cache()
+    key = fragment_key(name, scopes, vary)
+    content = cache.get(key)
+    if content is None:
+        record(name, 'miss')
+        content = render()
+        cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+    else:
+        record(name, 'hit')
+    return content
+
+
+def get_stats():
+    cache = get_cache()
+    stats = {}
+    for name in sorted(_names(cache)):
+        hits = cache.get(STATS_KEY.format(outcome='hit', name=name), 0)
+        misses = cache.get(STATS_KEY.format(outcome='miss', name=name), 0)
+        stats[name] = {'hit': hits, 'miss': misses}
+    return stats
+
+
+def reset_stats():
+    cache = get_cache()
+    names = _names(cache)
+    cache.delete_many(
+        [STATS_KEY.format(outcome=outcome, name=name) for name in names for outcome in ('hit', 'miss')]
+        + [STATS_REGISTERED_KEY.format(name=name) for name in names]
+        + [STATS_NAME_KEY.format(index=index) for index in range(1, cache.get(STATS_NAMES_KEY, 0) + 1)]
+        + [STATS_NAMES_KEY]
+    )
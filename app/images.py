@@ -0,0 +1,52 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+THUMBNAIL_DIR = 'thumbs'
+SCALES = (1, 2)
+
+
+def webp_supported():
+    Image.init()
+    return 'WEBP' in Image.SAVE
+
+
+def thumbnail_name(name, size, scale=1, fmt='jpg'):
+    width, height = settings.THUMBNAIL_SIZES[size]
+    stem = os.path.splitext(name)[0]
+    return f'{THUMBNAIL_DIR}/{stem}_{width * scale}x{height * scale}.{fmt}'
+
+
+def _save(name, image, fmt, **options):
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_thumbnails(name, sizes=None, force=True):
+    sizes = sizes or list(settings.THUMBNAIL_SIZES)
+    with_webp = webp_supported()
+    generated = 0
+    with default_storage.open(name) as source:
+        original = Image.open(source)
+        original.load()
+    original = ImageOps.exif_transpose(original).convert('RGB')
+    for size in sizes:
+        width, height = settings.THUMBNAIL_SIZES[size]
+        for scale in SCALES:
+            jpeg_name = thumbnail_name(name, size, scale)
+            if not force and default_storage.exists(jpeg_name):
+                continue
+            thumbnail = ImageOps.fit(original, (width * scale, height * scale), Image.LANCZOS)
+            _save(jpeg_name, thumbnail, 'JPEG', quality=settings.THUMBNAIL_QUALITY, optimize=True, progressive=True)
+            if with_webp:
+                _save(thumbnail_name(name, size, scale, 'webp'), thumbnail, 'WEBP',
+                      quality=settings.THUMBNAIL_QUALITY, method=4)
+            generated += 1
+    return generated
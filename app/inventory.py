@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app.fragment_cache import invalidate
+from app.models import Product, Reservation, in_stock_expression
+from app.tasks import enqueue
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f'Недостаточно товара: {", ".join(product.title for product in products)}')
+
+
+def availability_changed(product_ids):
+    # Остатки меняются queryset.update() без сигналов, поэтому все, что зависит от наличия товара,
+    # обновляется здесь: фрагменты после коммита, сводки каталога — задачей. В API наличия нет,
+    # поэтому версия ресурсов не растет и резервы не пишут в CatalogVersion
+    product_ids = sorted(product_ids)
+    scopes = [f'product:{pk}' for pk in product_ids] + ['products', 'catalog', 'recommendations']
+    transaction.on_commit(lambda: invalidate(*scopes))
+    enqueue('refresh_catalog_summaries', product_ids=product_ids)
+
+
+@contextmanager
+def tracking_availability(product_ids):
+    product_ids = set(product_ids)
+    before = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'availability'))
+    yield
+    after = Product.objects.filter(pk__in=product_ids).values_list('pk', 'availability')
+    changed = {pk for pk, available in after if before.get(pk) != available}
+    if changed:
+        availability_changed(changed)
+
+
+def _reserve_stock(product_id, qty):
+    # Проверка остатка и резерв — один UPDATE, поэтому два покупателя не могут зарезервировать одну единицу
+    return Product.objects.filter(pk=product_id, stock__gte=F('reserved') + qty).update(
+        reserved=F('reserved') + qty,
+        availability=in_stock_expression(qty),
+    )
+
+
+def _release_stock(product_id, qty):
+    Product.objects.filter(pk=product_id).update(
+        reserved=F('reserved') - qty,
+        availability=in_stock_expression(-qty),
+    )
+
+
+def reserve(cart, quantities):
+    # quantities: {Product: кол-во}
+    expires_at = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+    with transaction.atomic(), tracking_availability(product.pk for product in quantities):
+        missing = [product for product, qty in quantities.items() if qty > 0 and not _reserve_stock(product.pk, qty)]
+        if missing:
+            raise OutOfStock(missing)
+        Reservation.objects.bulk_create(
+            [Reservation(cart=cart, product=product, qty=0, expires_at=expires_at) for product in quantities],
+            ignore_conflicts=True,
+        )
+        for product, qty in quantities.items():
+            Reservation.objects.filter(cart=cart, product=product).update(qty=F('qty') + qty, expires_at=expires_at)
+
+
+def release(cart, quantities):
+    quantities = {product.pk: qty for product, qty in quantities.items()}
+    with transaction.atomic(), tracking_availability(quantities):
+        reservations = Reservation.objects.select_for_update().filter(cart=cart, product_id__in=list(quantities))
+        for reservation in reservations:
+            qty = min(reservation.qty, quantities[reservation.product_id])
+            if not qty:
+                continue
+            _release_stock(reservation.product_id, qty)
+            if qty == reservation.qty:
+                reservation.delete()
+            else:
+                Reservation.objects.filter(pk=reservation.pk).update(qty=F('qty') - qty)
+
+
+def commit(cart, lines):
+    # Списание со склада при оформлении заказа. Строки без живого резерва (истек или не создавался)
+    # резервируются заново, и если товара уже нет — заказ отклоняется целиком
+    with tracking_availability(line.product_id for line in lines):
+        _commit(cart, lines)
+
+
+def _commit(cart, lines):
+    reserved = dict(
+        Reservation.objects.select_for_update().filter(cart=cart).values_list('product_id', 'qty')
+    )
+    missing = []
+    for line in lines:
+        extra = line.qty - reserved.get(line.product_id, 0)
+        if extra > 0 and not _reserve_stock(line.product_id, extra):
+            missing.append(line.product)
+        elif extra < 0:
+            _release_stock(line.product_id, -extra)
+    for line in lines:
+        # stock и reserved уменьшаются на одно и то же число; условие на stock защищает от ситуации,
+        # когда остаток вручную уменьшили ниже уже зарезервированного
+        if line.product in missing:
+            continue
+        if not Product.objects.filter(pk=line.product_id, stock__gte=line.qty).update(
+            stock=F('stock') - line.qty,
+            reserved=F('reserved') - line.qty,
+            availability=in_stock_expression(),
+        ):
+            missing.append(line.product)
+    if missing:
+        raise OutOfStock(missing)
+    Reservation.objects.filter(cart=cart).delete()
+
+
+def release_expired(batch_size=500):
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                Reservation.objects.select_for_update()
+                .filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')[:batch_size]
+            )
+            with tracking_availability(reservation.product_id for reservation in expired):
+                for reservation in expired:
+                    _release_stock(reservation.product_id, reservation.qty)
+            Reservation.objects.filter(pk__in=[reservation.pk for reservation in expired]).delete()
+        released += len(expired)
+        if len(expired) < batch_size:
+            return released
@@ -0,0 +1,229 @@
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from app.management.commands.seed_catalog import BENCH_PASSWORD
+from app.models import Product, Category, Company, CartProduct, FavoriteProduct, User
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    def __init__(self, base_url, username=None):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.user = User.objects.get(username=username) if username else None
+        if username:
+            self.login(username)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def login(self, username):
+        body = self.open('GET', reverse('login'))[3]
+        token = CSRF_RE.search(body)
+        self.open('POST', reverse('login'), {
+            'username': username,
+            'password': BENCH_PASSWORD,
+            'csrfmiddlewaretoken': token.group(1) if token else self.csrf_token(),
+        })
+
+    def open(self, method, path, data=None):
+        payload = urlencode(data).encode() if data is not None else None
+        request = Request(f'{self.base_url}{path}', data=payload, method=method)
+        # Сервер считает запросы к БД и отключает debug toolbar для запросов с этим заголовком
+        request.add_header('X-Benchmark', '1')
+        if method == 'POST':
+            request.add_header('X-CSRFToken', self.csrf_token())
+            request.add_header('Referer', f'{self.base_url}{path}')
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(request, timeout=30)
+            status, headers, body = response.status, response.headers, response.read()
+        except HTTPError as error:
+            status, headers, body = error.code, error.headers, error.read()
+        elapsed = time.perf_counter() - started
+        queries = headers.get('X-Query-Count')
+        return status, elapsed, int(queries) if queries else None, body.decode('utf-8', 'replace')
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный прогон всех маршрутов магазина против запущенного сервера с отчетом p50/p95/p99'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на маршрут')
+        parser.add_argument('--routes', nargs='*', help='Прогнать только указанные маршруты')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='Допустимое ухудшение p95 и пропускной способности, %%')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.product_ids = list(Product.objects.values_list('pk', flat=True)[:5000])
+        self.category_ids = list(Category.objects.values_list('pk', flat=True))
+        self.company_ids = list(Company.objects.values_list('pk', flat=True)[:5000])
+        usernames = list(User.objects.filter(username__startswith='bench_user').values_list('username', flat=True)
+                         [:options['concurrency']])
+        if not self.product_ids or len(usernames) < options['concurrency']:
+            raise CommandError('Недостаточно данных: сначала выполните manage.py seed_catalog')
+        self.clients = threading.local()
+        self.base_url = options['base_url']
+        self.usernames = usernames
+        self.user_slots = iter(range(len(usernames)))
+        self.lock = threading.Lock()
+
+        routes = self.routes()
+        if options['routes']:
+            routes = {name: route for name, route in routes.items() if name in options['routes']}
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                for name, (needs_auth, make_request) in routes.items():
+                    results[name] = self.run_route(executor, needs_auth, make_request, options['requests'])
+                    self.report(name, results[name])
+        except URLError as error:
+            raise CommandError(f'Сервер {self.base_url} недоступен: {error.reason}')
+
+        run = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': self.revision(),
+            'options': {key: options[key] for key in ('base_url', 'concurrency', 'requests')},
+            'routes': results,
+        }
+        if results and all(result['queries_per_request'] is None for result in results.values()):
+            self.stderr.write('Сервер не вернул X-Query-Count: адрес бенчмарка должен быть в INTERNAL_IPS')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {options["output"]}'))
+        if options['compare']:
+            self.compare(run, options['compare'], options['threshold'])
+
+    def client(self, needs_auth):
+        if not hasattr(self.clients, 'anon'):
+            with self.lock:
+                slot = next(self.user_slots)
+            self.clients.anon = Client(self.base_url)
+            self.clients.user = Client(self.base_url, self.usernames[slot])
+        return self.clients.user if needs_auth else self.clients.anon
+
+    def routes(self):
+        product = lambda: random.choice(self.product_ids)
+
+        def cart_line(client):
+            line = CartProduct.objects.filter(user=client.user, cart__in_order=False).values_list('pk', flat=True).first()
+            if line is None:
+                client.open('GET', reverse('cart-add', kwargs={'pk': product()}))
+                line = CartProduct.objects.filter(user=client.user, cart__in_order=False).values_list('pk', flat=True).first()
+            return line
+
+        def favorite(client):
+            return FavoriteProduct.objects.filter(owner=client.user).values_list('pk', flat=True).first() or 0
+
+        return {
+            'home': (False, lambda client: ('GET', reverse('home'), None)),
+            'detail_product': (False, lambda client: ('GET', reverse('detail_product', kwargs={'pk': product()}), None)),
+            'catalog': (False, lambda client: ('GET', reverse('catalog'), None)),
+            'detail_category': (False, lambda client: (
+                'GET', reverse('detail_category', kwargs={'pk': random.choice(self.category_ids)}), None)),
+            'detail_company': (False, lambda client: (
+                'GET', reverse('detail_company', kwargs={'pk': random.choice(self.company_ids)}), None)),
+            'search': (False, lambda client: ('GET', f'{reverse("search")}?q=phone', None)),
+            'cart-add': (True, lambda client: ('GET', reverse('cart-add', kwargs={'pk': product()}), None)),
+            'qty': (True, lambda client: (
+                'POST', reverse('qty', kwargs={'pk': cart_line(client)}), {'number': random.randint(1, 5)})),
+            'delete_from_cart': (True, lambda client: (
+                'GET', reverse('delete_from_cart', kwargs={'pk': cart_line(client)}), None)),
+            'cart': (True, lambda client: ('GET', reverse('cart'), None)),
+            'favorites': (True, lambda client: ('GET', reverse('favorites'), None)),
+            'favorites-add': (True, lambda client: ('GET', reverse('favorites-add', kwargs={'pk': product()}), None)),
+            'favorites-del': (True, lambda client: ('GET', reverse('favorites-del', kwargs={'pk': favorite(client)}),
+                                                    None)),
+            'order': (True, lambda client: ('GET', reverse('order'), None)),
+        }
+
+    def run_route(self, executor, needs_auth, make_request, requests):
+        def call(_):
+            client = self.client(needs_auth)
+            method, path, data = make_request(client)
+            status, elapsed, queries, _ = client.open(method, path, data)
+            return status, elapsed, queries
+
+        started = time.perf_counter()
+        samples = list(executor.map(call, range(requests)))
+        wall = time.perf_counter() - started
+        latencies = [elapsed * 1000 for _, elapsed, _ in samples]
+        queries = [count for _, _, count in samples if count is not None]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for status, _, _ in samples if status >= 500),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+            'queries_per_request': round(sum(queries) / len(queries), 1) if queries else None,
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:18} p50={result["p50_ms"]:8.2f}мс p95={result["p95_ms"]:8.2f}мс p99={result["p99_ms"]:8.2f}мс '
+            f'rps={result["throughput_rps"]:7.1f} sql={result["queries_per_request"]} ошибок={result["errors"]}'
+        )
+
+    def revision(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, run, path, threshold):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)['routes']
+        regressions = []
+        for name, result in run['routes'].items():
+            before = previous.get(name)
+            if not before:
+                continue
+            p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            rps_change = ((result['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100
+                          if before['throughput_rps'] else 0)
+            self.stdout.write(f'{name:18} p95 {p95_change:+6.1f}%  rps {rps_change:+6.1f}%')
+            if p95_change > threshold or rps_change < -threshold:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f'Регрессия производительности: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.recommendations import rebuild_recommendations, update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Дописывает в рекомендации пары продуктов из новых заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать с нуля по всем заказам и избранному')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно с паузой --interval')
+        parser.add_argument('--interval', type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        if options['full']:
+            started = time.monotonic()
+            pairs, neighbours = rebuild_recommendations()
+            self.stdout.write(self.style.SUCCESS(
+                f'Пар продуктов: {pairs}, рекомендаций: {neighbours} за {time.monotonic() - started:.1f} с'
+            ))
+            return
+        while True:
+            pairs, neighbours = update_recommendations()
+            self.stdout.write(f'Новых пар: {pairs}, обновлено рекомендаций: {neighbours}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
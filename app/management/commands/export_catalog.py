@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_io import FIELDS, FORMATS, RowWriter, detect_format, export_rows, open_stream
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог (товары, компании или категории) в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(FIELDS))
+        parser.add_argument('path', help='Путь к файлу или - для stdout')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        fmt = detect_format(options['path'], options['format'])
+        started = time.monotonic()
+        try:
+            stream = open_stream(options['path'], 'w')
+        except OSError as error:
+            raise CommandError(error)
+        total = 0
+        with stream as stream:
+            writer = RowWriter(stream, fmt, FIELDS[kind])
+            for row in export_rows(kind, options['chunk_size']):
+                writer.write(row)
+                total += 1
+        elapsed = time.monotonic() - started
+        self.stderr.write(f'Выгружено строк: {total}; {elapsed:.1f} с, {total / elapsed if elapsed else total:.0f} строк/с')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.fragment_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша фрагментов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Сбросить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        for name, stats in get_stats().items():
+            total = stats['hit'] + stats['miss']
+            ratio = stats['hit'] / total * 100 if total else 0
+            self.stdout.write(f'{name}: hit={stats["hit"]} miss={stats["miss"]} ({ratio:.1f}%)')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики сброшены'))
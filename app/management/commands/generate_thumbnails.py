@@ -0,0 +1,47 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app.images import generate_thumbnails
+from app.models import Product, Company
+
+
+def _generate(name, sizes, force):
+    try:
+        return name, generate_thumbnails(name, sizes, force=force), None
+    except Exception as error:  # одна битая картинка не должна останавливать весь прогон
+        return name, 0, str(error)
+
+
+class Command(BaseCommand):
+    help = 'Генерирует превью (JPEG и WebP) для уже загруженных изображений продуктов и компаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Перегенерировать существующие превью')
+
+    def handle(self, *args, **options):
+        jobs = {name: settings.PRODUCT_THUMBNAILS
+                for name in Product.objects.exclude(image='').values_list('image', flat=True)}
+        jobs.update({name: settings.COMPANY_THUMBNAILS
+                     for name in Company.objects.exclude(logo='').values_list('logo', flat=True)})
+        # Соединения с БД не должны наследоваться дочерними процессами
+        connections.close_all()
+        started = time.monotonic()
+        generated = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_generate, name, sizes, options['force']) for name, sizes in jobs.items()]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                generated += count
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {len(jobs)}, создано превью: {generated}, ошибок: {failed} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,88 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from app.api import bump_catalog_version
+from app.catalog_io import FORMATS, IMPORTERS, RowError, detect_format, open_stream, read_rows
+from app.fragment_cache import invalidate
+from app.models import CatalogVersion
+from app.search import search_enabled
+
+
+class Command(BaseCommand):
+    help = 'Импортирует каталог (товары, компании или категории) из CSV или JSONL пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='Путь к файлу или - для stdin')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--skip-refresh', action='store_true',
+                            help='Не пересчитывать сводки каталога и поисковый индекс после импорта')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        importer = IMPORTERS[options['kind']]()
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total = errors = 0
+        try:
+            stream = open_stream(options['path'], 'r')
+        except OSError as error:
+            raise CommandError(error)
+        with stream as stream:
+            batch = []
+            for number, row in enumerate(read_rows(stream, fmt), start=1):
+                batch.append((number, row))
+                if len(batch) >= batch_size:
+                    errors += self.import_batch(importer, batch)
+                    total += len(batch)
+                    self.report(total, started)
+                    batch = []
+            if batch:
+                errors += self.import_batch(importer, batch)
+                total += len(batch)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {total}, создано: {importer.created}, обновлено: {importer.updated}, ошибок: {errors}; '
+            f'{elapsed:.1f} с, {total / elapsed if elapsed else total:.0f} строк/с'
+        ))
+        if not options['skip_refresh']:
+            self.refresh()
+
+    def import_batch(self, importer, batch):
+        importer.prepare([row for _, row in batch])
+        objects = []
+        errors = 0
+        for number, row in batch:
+            try:
+                objects.append((number, importer.build(row)))
+            except RowError as error:
+                errors += 1
+                self.stderr.write(f'Строка {number}: {error}')
+        if objects:
+            try:
+                importer.save([obj for _, obj in objects])
+            except IntegrityError:
+                # Пачка откатилась целиком: строки сохраняются по одной, чтобы назвать ту, что нарушает
+                # ограничение базы (тот же владелец у двух компаний и т.п.)
+                for number, obj in objects:
+                    try:
+                        importer.save([obj])
+                    except IntegrityError as error:
+                        raise CommandError(f'Строка {number}: {error}')
+        return errors
+
+    def report(self, total, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{total} строк, {total / elapsed if elapsed else total:.0f} строк/с')
+
+    def refresh(self):
+        # bulk-операции обходят сигналы, поэтому производные данные пересчитываются целиком
+        call_command('rebuild_catalog_summaries', stdout=self.stdout)
+        if search_enabled():
+            call_command('rebuild_search_index', stdout=self.stdout)
+        invalidate('products', 'catalog')
+        bump_catalog_version(*[resource for resource, _ in CatalogVersion.RESOURCE_CHOICES])
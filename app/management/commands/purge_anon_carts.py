@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Удаляет пустые анонимные корзины, которые создавались на каждый запрос незалогиненного пользователя'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        purged = 0
+        while True:
+            ids = list(
+                Cart.objects.filter(anon=True, owner__isnull=True).values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                Cart.objects.filter(pk__in=ids).delete()
+            purged += len(ids)
+            self.stdout.write(f'Удалено корзин: {purged}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, удалено анонимных корзин: {purged}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.query_stats import get_query_stats, reset_query_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает накопленную статистику SQL-запросов по view и подозрения на N+1'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Сбросить статистику после вывода')
+
+    def handle(self, *args, **options):
+        stats = get_query_stats()
+        for view_name, view in sorted(stats.items(), key=lambda item: -item[1]['queries']):
+            requests = view['requests'] or 1
+            self.stdout.write(
+                f'{view_name}: запросов={view["requests"]} '
+                f'sql/запрос={view["queries"] / requests:.1f} max={view["max_queries"]} '
+                f'db={view["db_time"] * 1000 / requests:.2f}мс n+1={view["n_plus_one"]}'
+            )
+            for sql, count in sorted(view['duplicates'].items(), key=lambda item: -item[1]):
+                self.stdout.write(f'    x{count}: {sql}')
+        if options['reset']:
+            reset_query_stats()
+            self.stdout.write(self.style.SUCCESS('Статистика сброшена'))
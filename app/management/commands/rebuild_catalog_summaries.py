@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.catalog_summaries import rebuild_catalog_summaries
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает сводки по компаниям и категориям'
+
+    def handle(self, *args, **options):
+        companies, categories = rebuild_catalog_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Сводки пересчитаны: компаний {companies}, категорий {categories}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum, IntegerField
+from django.db.models.functions import Cast
+
+from app.models import Product, Review
+
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_avg', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные рейтинги продуктов по таблице отзывов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        stats = Review.objects.values('product').annotate(
+            count=Count('pk'),
+            total=Sum(Cast('stars', IntegerField())),
+            **{f'stars_{stars}': Count('pk', filter=Q(stars=str(stars))) for stars in range(1, 6)},
+        )
+        stats = {row['product']: row for row in stats}
+        products = []
+        for product in Product.objects.only('pk').iterator():
+            row = stats.get(product.pk, {})
+            product.rating_count = row.get('count', 0)
+            product.rating_sum = row.get('total') or 0
+            product.rating_avg = round(product.rating_sum / product.rating_count, 2) if product.rating_count else 0
+            for stars in range(1, 6):
+                setattr(product, f'rating_{stars}', row.get(f'stars_{stars}', 0))
+            products.append(product)
+        with transaction.atomic():
+            Product.objects.bulk_update(products, RATING_FIELDS, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Рейтинги пересчитаны для {len(products)} продуктов'))
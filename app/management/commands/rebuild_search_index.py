@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.search import rebuild_search_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс продуктов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('Полнотекстовый индекс поддерживается только для SQLite')
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Cart
+from app.utils import cart_totals_expressions, cart_totals_subqueries
+
+
+class Command(BaseCommand):
+    help = 'Сверяет итоги корзин с их строками и исправляет расхождения пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Проверять также оформленные корзины')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        carts = Cart.objects.all() if options['all'] else Cart.objects.filter(in_order=False)
+        carts = carts.order_by('pk').annotate(**cart_totals_expressions('products__'))
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            batch = list(carts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+            drifted = [
+                cart.pk for cart in batch
+                if cart.final_quantity != cart.lines_qty or cart.final_price != cart.lines_price
+            ]
+            repaired += len(drifted)
+            if drifted and not options['dry_run']:
+                # Итоги пересчитываются заново в самом UPDATE, а не берутся из прочитанной выше пачки
+                Cart.objects.filter(pk__in=drifted).update(**cart_totals_subqueries())
+        action = 'найдено' if options['dry_run'] else 'исправлено'
+        self.stdout.write(self.style.SUCCESS(f'Проверено корзин: {checked}, {action} расхождений: {repaired}'))
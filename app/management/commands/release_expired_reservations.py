@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Снимает истекшие резервы товаров из корзин и возвращает их в свободный остаток'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно с паузой --interval')
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired(options['batch_size'])
+            self.stdout.write(f'Снято резервов: {released}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
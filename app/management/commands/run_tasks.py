@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.tasks import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач (письма о заказах и т.п.), хранящихся в таблице app_task'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь один раз и выйти')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза между опросами очереди, с')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = run_pending(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Выполнено задач: {processed}')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,125 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.fragment_cache import invalidate
+from app.models import (
+    User, Speciality, Company, Category, Product, Review, Cart, CartProduct, FavoriteProduct,
+)
+
+BENCH_PASSWORD = 'bench-password'
+WORDS = ['смартфон', 'ноутбук', 'планшет', 'часы', 'наушники', 'камера', 'монитор', 'колонка', 'роутер',
+         'phone', 'laptop', 'tablet', 'watch', 'pro', 'max', 'mini', 'air', 'ultra', 'lite', 'plus']
+
+
+class Command(BaseCommand):
+    help = 'Наполняет БД синтетическим каталогом для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        password = make_password(BENCH_PASSWORD)
+        with transaction.atomic():
+            users = self.create_users('bench_user', options['users'], password)
+            owners = self.create_users('bench_owner', options['companies'], password)
+            companies = self.create_companies(owners)
+            categories = self.create_categories(options['categories'], companies)
+            products = self.create_products(options['products'], companies, categories)
+            self.create_reviews(options['reviews'], users, products)
+            self.create_carts(options['carts'], users, products)
+            self.create_favorites(users, products)
+        for command in ('rebuild_ratings', 'rebuild_search_index', 'rebuild_catalog_summaries'):
+            call_command(command, stdout=self.stdout)
+        invalidate('products', 'catalog')
+        self.stdout.write(self.style.SUCCESS(f'Каталог создан за {time.monotonic() - started:.1f} с'))
+
+    def bulk(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {len(objects)}')
+        # bulk_create на SQLite не возвращает pk, поэтому перечитываем только что вставленные строки
+        return list(model.objects.order_by('-pk')[:len(objects)])[::-1]
+
+    def create_users(self, prefix, count, password):
+        start = User.objects.filter(username__startswith=prefix).count()
+        return self.bulk(User, [
+            User(username=f'{prefix}_{start + i}', password=password, first_name=prefix, last_name=str(start + i))
+            for i in range(count)
+        ])
+
+    def create_companies(self, owners):
+        specialities = self.bulk(Speciality, [Speciality(title=f'Специализация {i}') for i in range(10)])
+        logos = list(Company.objects.values_list('logo', flat=True).distinct()[:5]) or ['company_images/m1_book.jpg']
+        return self.bulk(Company, [
+            Company(title=f'Бренд {owner.pk}', owner=owner, logo=random.choice(logos),
+                    speciality=random.choice(specialities))
+            for owner in owners
+        ])
+
+    def create_categories(self, count, companies):
+        categories = self.bulk(Category, [Category(title=f'Категория {i}') for i in range(count)])
+        through = Category.brand.through
+        links = {(random.choice(categories).pk, company.pk) for company in companies for _ in range(2)}
+        through.objects.bulk_create(
+            [through(category_id=category_id, company_id=company_id) for category_id, company_id in links],
+            batch_size=self.batch_size,
+        )
+        return categories
+
+    def create_products(self, count, companies, categories):
+        images = list(Product.objects.values_list('image', flat=True).distinct()[:5]) or ['products_images/mac_mini.jpg']
+        products = []
+        for _ in range(count):
+            stock = random.choice([0, 5, 20, 100, 1000])
+            products.append(Product(
+                title=' '.join(random.sample(WORDS, 2)).capitalize()[:30],
+                description=' '.join(random.choices(WORDS, k=30)),
+                image=random.choice(images),
+                price=Decimal(random.randint(100, 300000)),
+                brand=random.choice(companies),
+                category=random.choice(categories),
+                stock=stock,
+                availability=stock > 0,
+            ))
+        return self.bulk(Product, products)
+
+    def create_reviews(self, count, users, products):
+        pairs = set()
+        while len(pairs) < min(count, len(users) * len(products)):
+            pairs.add((random.choice(users), random.choice(products)))
+        self.bulk(Review, [
+            Review(owner=owner, product=product, stars=str(random.randint(1, 5)), text=' '.join(random.choices(WORDS, k=12)))
+            for owner, product in pairs
+        ])
+
+    def create_carts(self, count, users, products):
+        carts = self.bulk(Cart, [Cart(owner=user) for user in users[:count]])
+        lines = []
+        for cart in carts:
+            for product in random.sample(products, random.randint(1, 8)):
+                qty = random.randint(1, 3)
+                lines.append(CartProduct(cart=cart, product=product, user_id=cart.owner_id, qty=qty,
+                                         final_price=product.price * qty))
+        self.bulk(CartProduct, lines)
+        call_command('reconcile_cart_totals', stdout=self.stdout)
+
+    def create_favorites(self, users, products):
+        self.bulk(FavoriteProduct, [
+            FavoriteProduct(owner=user, product=product)
+            for user in users for product in random.sample(products, 3)
+        ])
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.reports import rebuild_daily_stats, update_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Дописывает в дневную статистику новые строки заказов и отзывы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать статистику с нуля')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно с паузой --interval')
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(self.style.SUCCESS(self.summary(rebuild_daily_stats(options['batch_size']))))
+            return
+        while True:
+            self.stdout.write(self.summary(update_daily_stats(options['batch_size'])))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def summary(self, processed):
+        return f'Учтено строк заказов: {processed["order_lines"]}, отзывов: {processed["reviews"]}'
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import connection
+
+from app.query_stats import QueryRecorder, current_recorder, query_stats
+
+
+def is_internal(request):
+    return request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+
+
+def is_benchmark(request):
+    return bool(request.META.get(settings.BENCHMARK_HEADER)) and is_internal(request)
+
+
+def show_toolbar(request):
+    return settings.DEBUG and is_internal(request) and not is_benchmark(request)
+
+
+class QueryStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        query_stats.record(view_name, recorder)
+        if settings.QUERY_STATS_HEADERS or is_benchmark(request):
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-DB-Time'] = f'{recorder.duration * 1000:.2f}'
+        return response
@@ -0,0 +1,352 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('final_quantity', models.PositiveIntegerField(default=0, verbose_name='Кол-во товара')),
+                ('final_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Окончательная цена')),
+                ('anon', models.BooleanField(default=False, verbose_name='Анон')),
+                ('in_order', models.BooleanField(default=False, verbose_name='Статус корзины')),
+            ],
+            options={
+                'verbose_name': 'Корзина',
+                'verbose_name_plural': 'Корзины',
+            },
+        ),
+        migrations.CreateModel(
+            name='CartProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qty', models.PositiveIntegerField(default=1, verbose_name='Кол-во товара')),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Окончательная цена продукта')),
+            ],
+            options={
+                'verbose_name': 'Продукт для корзины',
+                'verbose_name_plural': 'Продукты для корзины',
+            },
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=30, verbose_name='Название категории')),
+            ],
+            options={
+                'verbose_name': 'Категория',
+                'verbose_name_plural': 'Категории',
+            },
+        ),
+        migrations.CreateModel(
+            name='Company',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=30, verbose_name='Название компании')),
+                ('logo', models.ImageField(upload_to='company_images', verbose_name='Лого')),
+            ],
+            options={
+                'verbose_name': 'Компания',
+                'verbose_name_plural': 'Компании',
+            },
+        ),
+        migrations.CreateModel(
+            name='FavoriteProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Продукт для fav',
+                'verbose_name_plural': 'Продукты для fav',
+            },
+        ),
+        migrations.CreateModel(
+            name='Favorites',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Избранное',
+                'verbose_name_plural': 'Избранное',
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=30, verbose_name='Имя')),
+                ('last_name', models.CharField(max_length=30, verbose_name='Фамилия')),
+                ('address', models.CharField(max_length=70, verbose_name='Адрес')),
+                ('phone', models.CharField(max_length=30, verbose_name='Телефон')),
+                ('email', models.EmailField(max_length=254, verbose_name='Почта')),
+                ('comment', models.TextField(max_length=1000, verbose_name='Комментраий')),
+                ('date_at', models.DateField(verbose_name='Число получения заказа')),
+                ('published_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('final_quantity', models.PositiveIntegerField(default=0, verbose_name='Кол-во товара')),
+                ('final_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма заказа')),
+            ],
+            options={
+                'verbose_name': 'Заказ',
+                'verbose_name_plural': 'Заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=30, verbose_name='Название продукта')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена на момент заказа')),
+                ('qty', models.PositiveIntegerField(verbose_name='Кол-во товара')),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Стоимость')),
+            ],
+            options={
+                'verbose_name': 'Строка заказа',
+                'verbose_name_plural': 'Строки заказа',
+            },
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=30, verbose_name='Название продукта')),
+                ('image', models.ImageField(upload_to='products_images', verbose_name='Изображение')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('description', models.TextField(blank=True, max_length=1000, null=True, verbose_name='Описание')),
+                ('availability', models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Наличие')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='Остаток на складе')),
+                ('reserved', models.PositiveIntegerField(default=0, editable=False, verbose_name='В резерве')),
+                ('rating_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во отзывов')),
+                ('rating_sum', models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок')),
+                ('rating_avg', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3, verbose_name='Рейтинг')),
+                ('rating_1', models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок ★')),
+                ('rating_2', models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок ★★')),
+                ('rating_3', models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок ★★★')),
+                ('rating_4', models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок ★★★★')),
+                ('rating_5', models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок ★★★★★')),
+                ('related_ids', models.JSONField(blank=True, default=list, editable=False, verbose_name='Похожие продукты')),
+            ],
+            options={
+                'verbose_name': 'Продукт',
+                'verbose_name_plural': 'Продукты',
+            },
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qty', models.PositiveIntegerField(default=0, verbose_name='Кол-во')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Резерв',
+                'verbose_name_plural': 'Резервы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stars', models.CharField(choices=[('5', '★★★★★'), ('4', '★★★★'), ('3', '★★★'), ('2', '★★'), ('1', '★')], default=1, max_length=20)),
+                ('text', models.TextField(max_length=500, verbose_name='Озыв')),
+            ],
+            options={
+                'verbose_name': 'Отзыв',
+                'verbose_name_plural': 'Отзывы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Speciality',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=30, verbose_name='Название')),
+            ],
+            options={
+                'verbose_name': 'Специализация',
+                'verbose_name_plural': 'Специализации',
+            },
+        ),
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Задача')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Аргументы')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='new', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить после')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_at'], name='app_task_status_0c5a69_idx'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_product', to='app.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='cart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='app.cart', verbose_name='Корзина'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='brand',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.company', verbose_name='Бренд'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review',
+            field=models.ManyToManyField(blank=True, related_name='product_review', to='app.Review', verbose_name='Отзыв'),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='app.order', verbose_name='Заказ'),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.cart', verbose_name='Корзина'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddField(
+            model_name='favorites',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddField(
+            model_name='favoriteproduct',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddField(
+            model_name='favoriteproduct',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.product', verbose_name='Продукт для избранного'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='owner',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='speciality',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.speciality', verbose_name='Специализация'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='brand',
+            field=models.ManyToManyField(to='app.Company', verbose_name='Компания'),
+        ),
+        migrations.AddField(
+            model_name='cartproduct',
+            name='cart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to='app.cart', verbose_name='Корзина'),
+        ),
+        migrations.AddField(
+            model_name='cartproduct',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='cartproduct',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('product', 'owner'), name='unique_product_review'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_reservation'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'availability'], name='app_product_categor_ad4128_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'category'], name='app_product_brand_i_ca0e2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='app_product_categor_8966f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-rating_avg', '-id'], name='app_product_categor_b15381_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoriteproduct',
+            constraint=models.UniqueConstraint(fields=('owner', 'product'), name='unique_owner_favorite'),
+        ),
+        migrations.AddIndex(
+            model_name='cartproduct',
+            index=models.Index(fields=['user', 'id'], name='app_cartpro_user_id_858a61_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartproduct',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['owner', 'in_order'], name='app_cart_owner_i_a971c1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(in_order=False), fields=('owner',), name='unique_open_cart'),
+        ),
+    ]
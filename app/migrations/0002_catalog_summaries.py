@@ -0,0 +1,54 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:17
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySummary',
+            fields=[
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('in_stock_count', models.PositiveIntegerField(default=0, verbose_name='В наличии')),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Цена от')),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Цена до')),
+                ('rating_avg', models.DecimalField(decimal_places=2, default=0, max_digits=3, verbose_name='Средний рейтинг')),
+                ('top_products', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Лучшие товары')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='app.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Сводка по категории',
+                'verbose_name_plural': 'Сводки по категориям',
+            },
+        ),
+        migrations.CreateModel(
+            name='CompanySummary',
+            fields=[
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('in_stock_count', models.PositiveIntegerField(default=0, verbose_name='В наличии')),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Цена от')),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Цена до')),
+                ('rating_avg', models.DecimalField(decimal_places=2, default=0, max_digits=3, verbose_name='Средний рейтинг')),
+                ('top_products', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Лучшие товары')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='app.company', verbose_name='Компания')),
+                ('categories', models.JSONField(default=list, verbose_name='Категории')),
+            ],
+            options={
+                'verbose_name': 'Сводка по компании',
+                'verbose_name_plural': 'Сводки по компаниям',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', '-rating_avg', '-id'], name='app_product_brand_i_c236f5_idx'),
+        ),
+    ]
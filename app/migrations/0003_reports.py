@@ -0,0 +1,62 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_catalog_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('dimension', models.CharField(choices=[('product', 'Продукт'), ('brand', 'Бренд'), ('category', 'Категория'), ('speciality', 'Специализация')], max_length=20, verbose_name='Разрез')),
+                ('key', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('title', models.CharField(max_length=30, verbose_name='Название')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Продано штук')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Отзывов')),
+                ('stars_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('stars_1', models.PositiveIntegerField(default=0, verbose_name='★')),
+                ('stars_2', models.PositiveIntegerField(default=0, verbose_name='★★')),
+                ('stars_3', models.PositiveIntegerField(default=0, verbose_name='★★★')),
+                ('stars_4', models.PositiveIntegerField(default=0, verbose_name='★★★★')),
+                ('stars_5', models.PositiveIntegerField(default=0, verbose_name='★★★★★')),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика',
+                'verbose_name_plural': 'Дневная статистика',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportCursor',
+            fields=[
+                ('name', models.CharField(max_length=30, primary_key=True, serialize=False, verbose_name='Источник')),
+                ('last_id', models.PositiveBigIntegerField(default=0, verbose_name='Последний id')),
+            ],
+            options={
+                'verbose_name': 'Позиция отчетов',
+                'verbose_name_plural': 'Позиции отчетов',
+            },
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='published_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата отзыва'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='dailystat',
+            index=models.Index(fields=['dimension', 'day'], name='app_dailyst_dimensi_09bbe1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystat',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'day'), name='unique_daily_stat'),
+        ),
+    ]
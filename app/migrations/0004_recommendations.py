@@ -0,0 +1,50 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNeighbour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Вес')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='app.product', verbose_name='С ним покупают')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='app.product', verbose_name='Продукт')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+            },
+        ),
+        migrations.CreateModel(
+            name='CoOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='В заказах')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='В избранном')),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.product', verbose_name='Продукт A')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.product', verbose_name='Продукт B')),
+            ],
+            options={
+                'verbose_name': 'Совместная встречаемость',
+                'verbose_name_plural': 'Совместная встречаемость',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productneighbour',
+            constraint=models.UniqueConstraint(fields=('product', 'rank'), name='unique_product_neighbour_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='cooccurrence',
+            constraint=models.UniqueConstraint(fields=('product_a', 'product_b'), name='unique_co_occurrence'),
+        ),
+    ]
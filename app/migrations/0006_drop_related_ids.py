@@ -0,0 +1,25 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='app_product_categor_ad4128_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='related_ids',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'availability', 'id'], name='app_product_categor_ffb172_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_drop_related_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начата'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+def drop_versions(apps, schema_editor):
+    # Общая версия не переносится: ETag теперь включает имя ресурса и со старыми все равно не совпадет
+    apps.get_model('app', 'CatalogVersion').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_task_started_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_versions, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='catalogversion',
+            name='resource',
+            field=models.CharField(choices=[('products', 'Продукты'), ('reviews', 'Отзывы'), ('categories', 'Категории'), ('companies', 'Компании')], default='products', max_length=20, unique=True, verbose_name='Ресурс'),
+            preserve_default=False,
+        ),
+        migrations.AlterModelOptions(
+            name='catalogversion',
+            options={'verbose_name': 'Версия каталога', 'verbose_name_plural': 'Версии каталога'},
+        ),
+    ]
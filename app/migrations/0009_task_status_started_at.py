@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_catalog_version_per_resource'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'started_at'], name='app_task_status_4d15bd_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 3.1.7 on 2026-10-18 13:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_task_status_started_at'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Favorites',
+        ),
+    ]
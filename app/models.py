@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 from Shop.settings import PRODUCT_IMAGE_DIR, COMPANY_IMAGE_DIR
 
@@ -15,14 +17,56 @@ class Product(models.Model):
     review = models.ManyToManyField('Review', verbose_name='Отзыв', blank=True,
                                     related_name='product_review')
     category = models.ForeignKey('Category', on_delete=models.CASCADE, verbose_name='Категория')
-    availability = models.BooleanField(default=True, verbose_name='Наличие', blank=True)
+    availability = models.BooleanField(default=False, verbose_name='Наличие', editable=False, db_index=True)
+    stock = models.PositiveIntegerField(default=0, verbose_name='Остаток на складе')
+    reserved = models.PositiveIntegerField(default=0, verbose_name='В резерве', editable=False)
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Кол-во отзывов', editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name='Сумма оценок', editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, verbose_name='Рейтинг',
+                                     editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, verbose_name='Оценок ★', editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, verbose_name='Оценок ★★', editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, verbose_name='Оценок ★★★', editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, verbose_name='Оценок ★★★★', editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, verbose_name='Оценок ★★★★★', editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # reserved меняется только атомарными UPDATE в app.inventory, поэтому обычное сохранение
+        # (например, из админки) не должно перезаписывать его устаревшим значением
+        if not self._state.adding and not kwargs.get('update_fields'):
+            self.reserved = Product.objects.values_list('reserved', flat=True).get(pk=self.pk)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
+        self.availability = self.stock > self.reserved
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        return [(stars, getattr(self, f'rating_{stars}')) for stars in range(5, 0, -1)]
+
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
+        indexes = [
+            models.Index(fields=['category', 'availability', 'id']),
+            models.Index(fields=['brand', 'category']),
+            models.Index(fields=['category', 'price', 'id']),
+            models.Index(fields=['category', '-rating_avg', '-id']),
+            models.Index(fields=['brand', '-rating_avg', '-id']),
+        ]
+
+
+def in_stock_expression(reserved_delta=0):
+    return models.Case(
+        models.When(stock__gt=models.F('reserved') + reserved_delta, then=models.Value(True)),
+        default=models.Value(False),
+        output_field=models.BooleanField(),
+    )
 
 
 class Category(models.Model):
@@ -52,10 +96,14 @@ class Review(models.Model):
                                 on_delete=models.CASCADE,
                                 related_name='review_product'
                                 )
+    published_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата отзыва')
 
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'owner'], name='unique_product_review'),
+        ]
 
     def __str__(self):
         return f'Отзыв пользователя - {self.owner}'
@@ -75,6 +123,45 @@ class Company(models.Model):
         verbose_name_plural = 'Компании'
 
 
+class CatalogSummary(models.Model):
+    # Агрегаты по товарам, пересчитываемые при изменениях каталога (app.catalog_summaries)
+    product_count = models.PositiveIntegerField(default=0, verbose_name='Товаров')
+    in_stock_count = models.PositiveIntegerField(default=0, verbose_name='В наличии')
+    price_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, verbose_name='Цена от')
+    price_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, verbose_name='Цена до')
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, verbose_name='Средний рейтинг')
+    top_products = models.JSONField(default=list, encoder=DjangoJSONEncoder, verbose_name='Лучшие товары')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        abstract = True
+
+
+class CompanySummary(CatalogSummary):
+    company = models.OneToOneField('Company', on_delete=models.CASCADE, primary_key=True, related_name='summary',
+                                   verbose_name='Компания')
+    categories = models.JSONField(default=list, verbose_name='Категории')
+
+    class Meta:
+        verbose_name = 'Сводка по компании'
+        verbose_name_plural = 'Сводки по компаниям'
+
+    def __str__(self):
+        return f'Сводка {self.company_id}'
+
+
+class CategorySummary(CatalogSummary):
+    category = models.OneToOneField('Category', on_delete=models.CASCADE, primary_key=True, related_name='summary',
+                                    verbose_name='Категория')
+
+    class Meta:
+        verbose_name = 'Сводка по категории'
+        verbose_name_plural = 'Сводки по категориям'
+
+    def __str__(self):
+        return f'Сводка {self.category_id}'
+
+
 class Speciality(models.Model):
     title = models.CharField(max_length=30, verbose_name='Название')
 
@@ -87,7 +174,6 @@ class Speciality(models.Model):
 
 
 class Cart(models.Model):
-    products = models.ManyToManyField('CartProduct', verbose_name='Продукты', blank=True, related_name='products')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Владелец', null=True)
     final_quantity = models.PositiveIntegerField(verbose_name='Кол-во товара', default=0)
     final_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Окончательная цена', default=0)
@@ -101,12 +187,19 @@ class Cart(models.Model):
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+        indexes = [
+            models.Index(fields=['owner', 'in_order']),
+        ]
+        constraints = [
+            # У пользователя может быть только одна открытая корзина
+            models.UniqueConstraint(fields=['owner'], condition=models.Q(in_order=False), name='unique_open_cart'),
+        ]
 
 
 class CartProduct(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE, verbose_name='Продукт')
     qty = models.PositiveIntegerField(default=1, verbose_name='Кол-во товара')
-    cart = models.ForeignKey('Cart', on_delete=models.CASCADE, verbose_name='Корзина')
+    cart = models.ForeignKey('Cart', on_delete=models.CASCADE, verbose_name='Корзина', related_name='products')
     final_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Окончательная цена продукта')
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Владелец')
 
@@ -117,21 +210,32 @@ class CartProduct(models.Model):
     class Meta:
         verbose_name = 'Продукт для корзины'
         verbose_name_plural = 'Продукты для корзины'
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
 
     def __str__(self):
         return f'Продукт для корзины пользователя - {self.cart.owner}'
 
 
-class Favorites(models.Model):
-    products = models.ManyToManyField('FavoriteProduct', verbose_name='Избранные продукты')
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Владелец')
+class Reservation(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, verbose_name='Продукт')
+    cart = models.ForeignKey('Cart', on_delete=models.CASCADE, verbose_name='Корзина', related_name='reservations')
+    qty = models.PositiveIntegerField(default=0, verbose_name='Кол-во')
+    expires_at = models.DateTimeField(verbose_name='Истекает', db_index=True)
 
     class Meta:
-        verbose_name = 'Избранное'
-        verbose_name_plural = 'Избранное'
+        verbose_name = 'Резерв'
+        verbose_name_plural = 'Резервы'
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_reservation'),
+        ]
 
     def __str__(self):
-        return self.owner.username
+        return f'Резерв {self.product_id} x{self.qty}'
 
 
 class FavoriteProduct(models.Model):
@@ -144,6 +248,9 @@ class FavoriteProduct(models.Model):
     class Meta:
         verbose_name = 'Продукт для fav'
         verbose_name_plural = 'Продукты для fav'
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'product'], name='unique_owner_favorite'),
+        ]
 
 
 class Order(models.Model):
@@ -154,9 +261,11 @@ class Order(models.Model):
     email = models.EmailField(verbose_name='Почта')
     comment = models.TextField(max_length=1000, verbose_name='Комментраий')
     date_at = models.DateField(verbose_name='Число получения заказа')
-    published_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(auto_now_add=True, db_index=True)
     cart = models.ForeignKey('Cart', on_delete=models.CASCADE, verbose_name='Корзина')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Владелец')
+    final_quantity = models.PositiveIntegerField(verbose_name='Кол-во товара', default=0)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма заказа', default=0)
 
     def __str__(self):
         return f'Заказ пользователя - {self.owner.username}'
@@ -164,3 +273,164 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, verbose_name='Заказ', related_name='lines')
+    product = models.ForeignKey('Product', on_delete=models.SET_NULL, verbose_name='Продукт', null=True)
+    title = models.CharField(max_length=30, verbose_name='Название продукта')
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена на момент заказа')
+    qty = models.PositiveIntegerField(verbose_name='Кол-во товара')
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Стоимость')
+
+    class Meta:
+        verbose_name = 'Строка заказа'
+        verbose_name_plural = 'Строки заказа'
+
+    def __str__(self):
+        return f'{self.title} x{self.qty}'
+
+
+class Task(models.Model):
+    NEW = 'new'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (NEW, 'Новая'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Аргументы')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=NEW, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Выполнить после')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['status', 'started_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
+
+
+class CoOccurrence(models.Model):
+    # Сколько раз пара продуктов встретилась в одном заказе и в избранном одного пользователя; product_a < product_b
+    product_a = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='+', verbose_name='Продукт A')
+    product_b = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='+', verbose_name='Продукт B')
+    orders = models.PositiveIntegerField(default=0, verbose_name='В заказах')
+    favorites = models.PositiveIntegerField(default=0, verbose_name='В избранном')
+
+    class Meta:
+        verbose_name = 'Совместная встречаемость'
+        verbose_name_plural = 'Совместная встречаемость'
+        constraints = [
+            models.UniqueConstraint(fields=['product_a', 'product_b'], name='unique_co_occurrence'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_a_id} + {self.product_b_id}'
+
+
+class ProductNeighbour(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='neighbours',
+                                verbose_name='Продукт')
+    neighbour = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='neighbour_of',
+                                  verbose_name='С ним покупают')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_neighbour_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.neighbour_id}'
+
+
+class DailyStat(models.Model):
+    PRODUCT = 'product'
+    BRAND = 'brand'
+    CATEGORY = 'category'
+    SPECIALITY = 'speciality'
+    DIMENSION_CHOICES = [
+        (PRODUCT, 'Продукт'),
+        (BRAND, 'Бренд'),
+        (CATEGORY, 'Категория'),
+        (SPECIALITY, 'Специализация'),
+    ]
+    day = models.DateField(verbose_name='День')
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES, verbose_name='Разрез')
+    key = models.PositiveIntegerField(verbose_name='id объекта')
+    title = models.CharField(max_length=30, verbose_name='Название')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Выручка')
+    units = models.PositiveIntegerField(default=0, verbose_name='Продано штук')
+    review_count = models.PositiveIntegerField(default=0, verbose_name='Отзывов')
+    stars_sum = models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')
+    stars_1 = models.PositiveIntegerField(default=0, verbose_name='★')
+    stars_2 = models.PositiveIntegerField(default=0, verbose_name='★★')
+    stars_3 = models.PositiveIntegerField(default=0, verbose_name='★★★')
+    stars_4 = models.PositiveIntegerField(default=0, verbose_name='★★★★')
+    stars_5 = models.PositiveIntegerField(default=0, verbose_name='★★★★★')
+
+    class Meta:
+        verbose_name = 'Дневная статистика'
+        verbose_name_plural = 'Дневная статистика'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'day'], name='unique_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'day']),
+        ]
+
+    def __str__(self):
+        return f'{self.get_dimension_display()} {self.title} за {self.day}'
+
+
+class ReportCursor(models.Model):
+    # Последний учтенный в дневной статистике id строки заказа или отзыва
+    name = models.CharField(max_length=30, primary_key=True, verbose_name='Источник')
+    last_id = models.PositiveBigIntegerField(default=0, verbose_name='Последний id')
+
+    class Meta:
+        verbose_name = 'Позиция отчетов'
+        verbose_name_plural = 'Позиции отчетов'
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+
+class CatalogVersion(models.Model):
+    # Строка на каждый ресурс API: номер растет в той же транзакции, что и изменение данных ресурса,
+    # и из него строится ETag. Несвязанные записи (товары и отзывы) не ждут друг друга на одной строке
+    PRODUCTS = 'products'
+    REVIEWS = 'reviews'
+    CATEGORIES = 'categories'
+    COMPANIES = 'companies'
+    RESOURCE_CHOICES = [
+        (PRODUCTS, 'Продукты'),
+        (REVIEWS, 'Отзывы'),
+        (CATEGORIES, 'Категории'),
+        (COMPANIES, 'Компании'),
+    ]
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES, unique=True, verbose_name='Ресурс')
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = 'Версии каталога'
+
+    def __str__(self):
+        return f'{self.resource}: {self.version}'
@@ -0,0 +1,91 @@
+import base64
+import json
+from decimal import Decimal
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) if isinstance(value, Decimal) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def keyset_page_urls(request, page):
+    # Ссылки на следующую и первую страницу сохраняют фильтры и сортировку из адреса
+    next_page_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_page_url = f'?{params.urlencode()}'
+    first_page_params = request.GET.copy()
+    first_page_params.pop('cursor', None)
+    return {
+        'next_page_url': next_page_url,
+        'first_page_url': f'?{first_page_params.urlencode()}',
+        'is_first_page': 'cursor' not in request.GET,
+    }
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+# Пагинация по ключу: следующая страница начинается строго после последней строки предыдущей,
+# поэтому глубокие страницы стоят столько же, сколько первая, и не требуют COUNT(*)
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+
+    def _fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def _after(self, values):
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self._fields(), values):
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        values = decode_cursor(cursor) if cursor else None
+        if values and len(values) == len(self.ordering):
+            try:
+                queryset = queryset.filter(self._after(values))
+            except (ValidationError, ValueError, TypeError):
+                pass
+        items = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(items) > self.per_page:
+            items = items[:self.per_page]
+            last = items[-1]
+            # Страница может состоять как из моделей, так и из словарей .values()
+            get = last.get if isinstance(last, dict) else partial(getattr, last)
+            next_cursor = encode_cursor([get(field) for field, _ in self._fields()])
+        return KeysetPage(items, next_cursor)
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger('app.query_stats')
+
+# Каждый процесс пишет только свой снимок статистики, а команда query_stats складывает снимки всех
+# процессов: у ключа один писатель, поэтому параллельные сбросы ничего не теряют.
+# Ключи снимков перечислены в ячейках под номерами из атомарного счетчика
+SNAPSHOT_KEY = 'query-stats:snapshot:{process}'
+PROCESSES_KEY = 'query-stats:processes'
+PROCESS_KEY = 'query-stats:process:{index}'
+# Растет при сбросе статистики; процесс, увидевший новое значение, начинает свой снимок заново
+GENERATION_KEY = 'query-stats:generation'
+
+# Счетчик текущего запроса: через него запросы из потоков async-представлений попадают в ту же статистику
+current_recorder = ContextVar('query_recorder', default=None)
+
+
+def get_cache():
+    return caches[settings.QUERY_STATS_CACHE_ALIAS]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.signatures[sql] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.signatures.most_common() if count >= threshold]
+
+
+class QueryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Статистика процесса с последнего сброса; flush целиком записывает ее в снимок процесса
+        self.views = {}
+        self.reported = set()
+        self.last_flush = time.monotonic()
+        self.key = SNAPSHOT_KEY.format(process=uuid.uuid4().hex)
+        self.generation = None
+        self.registered = False
+
+    def record(self, view_name, recorder):
+        if self.generation is None:
+            self.generation = get_cache().get(GENERATION_KEY, 0)
+        duplicates = recorder.duplicates(settings.QUERY_STATS_DUPLICATE_THRESHOLD)
+        with self.lock:
+            view = self.views.setdefault(view_name, _empty_view_stats())
+            view['requests'] += 1
+            view['queries'] += recorder.count
+            view['db_time'] += recorder.duration
+            view['max_queries'] = max(view['max_queries'], recorder.count)
+            if duplicates:
+                view['n_plus_one'] += 1
+                for sql, count in duplicates:
+                    view['duplicates'][sql] = max(view['duplicates'].get(sql, 0), count)
+            new_reports = [(sql, count) for sql, count in duplicates if (view_name, sql) not in self.reported]
+            self.reported.update((view_name, sql) for sql, _ in new_reports)
+            should_flush = time.monotonic() - self.last_flush >= settings.QUERY_STATS_FLUSH_INTERVAL
+        for sql, count in new_reports:
+            logger.warning('Возможный N+1 в %s: запрос выполнен %d раз: %s', view_name, count, sql)
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        cache = get_cache()
+        generation = cache.get(GENERATION_KEY, 0)
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if self.generation is not None and generation != self.generation:
+                # Статистику сбросили: накопленное до сброса не учитывается, снимок регистрируется заново
+                self.views = {}
+                self.registered = False
+            self.generation = generation
+            snapshot = {view_name: dict(view, duplicates=dict(view['duplicates']))
+                        for view_name, view in self.views.items()}
+            register = snapshot and not self.registered
+            self.registered = self.registered or bool(snapshot)
+        if not self.registered:
+            return
+        if register:
+            cache.add(PROCESSES_KEY, 0, timeout=None)
+            cache.set(PROCESS_KEY.format(index=cache.incr(PROCESSES_KEY)), self.key, timeout=None)
+        cache.set(self.key, snapshot, timeout=None)
+
+
+def _empty_view_stats():
+    return {'requests': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0, 'n_plus_one': 0, 'duplicates': {}}
+
+
+def _merge(target, source):
+    for field in ('requests', 'queries', 'db_time', 'n_plus_one'):
+        target[field] += source[field]
+    target['max_queries'] = max(target['max_queries'], source['max_queries'])
+    for sql, count in source['duplicates'].items():
+        target['duplicates'][sql] = max(target['duplicates'].get(sql, 0), count)
+
+
+query_stats = QueryStats()
+
+
+def _process_keys(cache):
+    keys = [PROCESS_KEY.format(index=index) for index in range(1, cache.get(PROCESSES_KEY, 0) + 1)]
+    return keys, list(cache.get_many(keys).values())
+
+
+def get_query_stats():
+    query_stats.flush()
+    cache = get_cache()
+    stats = {}
+    for snapshot in cache.get_many(_process_keys(cache)[1]).values():
+        for view_name, view in snapshot.items():
+            _merge(stats.setdefault(view_name, _empty_view_stats()), view)
+    return stats
+
+
+def reset_query_stats():
+    cache = get_cache()
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    cache.incr(GENERATION_KEY)
+    slots, snapshots = _process_keys(cache)
+    cache.delete_many(slots + snapshots + [PROCESSES_KEY])
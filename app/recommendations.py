@@ -0,0 +1,177 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from app.favorites import favorite_ids
+from app.fragment_cache import invalidate
+from app.models import Product, OrderLine, FavoriteProduct, CoOccurrence, ProductNeighbour, ReportCursor
+
+CURSOR_NAME = 'recommendations'
+
+
+def _arrays(rows):
+    # Пары (корзина, продукт) из values_list в два массива numpy
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def pair_counts(baskets, items, max_basket=None):
+    # Для каждой неупорядоченной пары продуктов считает, в скольких корзинах они встретились вместе.
+    # Все пары строятся векторно: у каждого элемента корзины в партнерах все элементы правее него
+    max_basket = max_basket or settings.RECOMMENDATION_MAX_BASKET
+    order = np.lexsort((items, baskets))
+    baskets, items = baskets[order], items[order]
+    unique = np.ones(len(items), dtype=bool)
+    unique[1:] = (baskets[1:] != baskets[:-1]) | (items[1:] != items[:-1])
+    baskets, items = baskets[unique], items[unique]
+    # Огромные корзины (сотни товаров в избранном) дают квадратичное число пар и почти ничего не значат
+    position = _position_in_group(baskets)
+    baskets, items = baskets[position < max_basket], items[position < max_basket]
+    if not len(items):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    position = _position_in_group(baskets)
+    sizes = np.bincount(np.unique(baskets, return_inverse=True)[1])
+    partners = np.repeat(sizes, sizes) - position - 1
+    left = np.repeat(np.arange(len(items)), partners)
+    offset = np.arange(len(left)) - np.repeat(np.cumsum(partners) - partners, partners)
+    right = left + 1 + offset
+    base = int(items.max()) + 1
+    keys, counts = np.unique(items[left] * base + items[right], return_counts=True)
+    return keys // base, keys % base, counts
+
+
+def _position_in_group(groups):
+    starts = np.ones(len(groups), dtype=bool)
+    starts[1:] = groups[1:] != groups[:-1]
+    indexes = np.arange(len(groups))
+    return indexes - np.maximum.accumulate(np.where(starts, indexes, 0))
+
+
+def _order_baskets(queryset):
+    return _arrays(queryset.filter(product__isnull=False).values_list('order_id', 'product_id').iterator())
+
+
+def _save_neighbours(product_ids=None):
+    # Для продуктов product_ids (или всех) заново выбираются top-K соседей по весу пары
+    pairs = CoOccurrence.objects.all()
+    if product_ids is not None:
+        pairs = pairs.filter(Q(product_a__in=product_ids) | Q(product_b__in=product_ids))
+    data = np.array(list(pairs.values_list('product_a_id', 'product_b_id', 'orders', 'favorites').iterator()),
+                    dtype=np.int64).reshape(-1, 4)
+    scores = data[:, 2] + settings.RECOMMENDATION_FAVORITE_WEIGHT * data[:, 3]
+    sources = np.concatenate([data[:, 0], data[:, 1]])
+    targets = np.concatenate([data[:, 1], data[:, 0]])
+    scores = np.concatenate([scores, scores])
+    if product_ids is not None:
+        mask = np.isin(sources, list(product_ids))
+        sources, targets, scores = sources[mask], targets[mask], scores[mask]
+    order = np.lexsort((targets, -scores, sources))
+    sources, targets, scores = sources[order], targets[order], scores[order]
+    ranks = _position_in_group(sources)
+    top = ranks < settings.RECOMMENDATION_NEIGHBOURS
+    neighbours = [
+        ProductNeighbour(product_id=source, neighbour_id=target, rank=rank, score=score)
+        for source, target, rank, score in zip(
+            sources[top].tolist(), targets[top].tolist(), ranks[top].tolist(), scores[top].tolist(),
+        )
+    ]
+    old = ProductNeighbour.objects.all()
+    if product_ids is not None:
+        old = old.filter(product__in=product_ids)
+    old.delete()
+    ProductNeighbour.objects.bulk_create(neighbours, batch_size=1000)
+    return len(neighbours)
+
+
+def _add_order_pairs(first, second, counts):
+    existing = {
+        (pair.product_a_id, pair.product_b_id): pair
+        for pair in CoOccurrence.objects.filter(product_a__in=set(first.tolist()), product_b__in=set(second.tolist()))
+    }
+    to_update, to_create = [], []
+    for a, b, count in zip(first.tolist(), second.tolist(), counts.tolist()):
+        pair = existing.get((a, b))
+        if pair is None:
+            to_create.append(CoOccurrence(product_a_id=a, product_b_id=b, orders=count))
+        else:
+            pair.orders += count
+            to_update.append(pair)
+    CoOccurrence.objects.bulk_update(to_update, ['orders'], batch_size=1000)
+    CoOccurrence.objects.bulk_create(to_create, batch_size=1000)
+
+
+def rebuild_recommendations():
+    with transaction.atomic():
+        cursor, _ = ReportCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+        last_id = OrderLine.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        first, second, orders = pair_counts(*_order_baskets(OrderLine.objects.filter(pk__lte=last_id)))
+        fav_first, fav_second, favorites = pair_counts(*_arrays(
+            FavoriteProduct.objects.values_list('owner_id', 'product_id').iterator()
+        ))
+        # Пары из заказов и из избранного сводятся в одну таблицу
+        base = int(max(second.max(initial=0), fav_second.max(initial=0))) + 1
+        keys, inverse = np.unique(np.concatenate([first * base + second, fav_first * base + fav_second]),
+                                  return_inverse=True)
+        order_counts = np.bincount(inverse[:len(orders)], weights=orders, minlength=len(keys))
+        favorite_counts = np.bincount(inverse[len(orders):], weights=favorites, minlength=len(keys))
+        CoOccurrence.objects.all().delete()
+        CoOccurrence.objects.bulk_create([
+            CoOccurrence(product_a_id=key // base, product_b_id=key % base, orders=order_count, favorites=favorite_count)
+            for key, order_count, favorite_count in zip(
+                keys.tolist(), order_counts.astype(np.int64).tolist(), favorite_counts.astype(np.int64).tolist(),
+            )
+        ], batch_size=1000)
+        neighbours = _save_neighbours()
+        cursor.last_id = last_id
+        cursor.save(update_fields=['last_id'])
+    invalidate('recommendations')
+    return len(keys), neighbours
+
+
+def update_recommendations():
+    # Дописывает только новые заказы: пересчитываются пары из них и соседи затронутых продуктов
+    settled = timezone.now() - timedelta(seconds=settings.REPORT_SETTLE_DELAY)
+    with transaction.atomic():
+        ReportCursor.objects.get_or_create(name=CURSOR_NAME)
+        cursor = ReportCursor.objects.select_for_update().get(name=CURSOR_NAME)
+        lines = OrderLine.objects.filter(pk__gt=cursor.last_id, order__published_at__lte=settled)
+        last_id = lines.aggregate(last_id=Max('pk'))['last_id']
+        if last_id is None:
+            return 0, 0
+        first, second, counts = pair_counts(*_order_baskets(lines.filter(pk__lte=last_id)))
+        neighbours = 0
+        if len(counts):
+            _add_order_pairs(first, second, counts)
+            neighbours = _save_neighbours(set(np.concatenate([first, second]).tolist()))
+        cursor.last_id = last_id
+        cursor.save(update_fields=['last_id'])
+    if neighbours:
+        invalidate('recommendations')
+    return len(counts), neighbours
+
+
+def bought_together(product_id):
+    # Один запрос по индексу (product, rank)
+    return list(
+        Product.objects.filter(neighbour_of__product=product_id, availability=True).order_by('neighbour_of__rank')
+    )
+
+
+def recommended_for(user, limit=None):
+    if not user.is_authenticated:
+        return []
+    seeds = set(favorite_ids(user)) | set(OrderLine.objects.filter(
+        order__owner=user, product__isnull=False,
+    ).order_by('-pk').values_list('product_id', flat=True)[:settings.RECOMMENDATION_SEEDS])
+    if not seeds:
+        return []
+    return list(
+        Product.objects.filter(neighbour_of__product__in=seeds, availability=True).exclude(pk__in=seeds)
+        .annotate(recommendation_score=Sum('neighbour_of__score'))
+        .order_by('-recommendation_score', '-pk')[:limit or settings.RECOMMENDATIONS_ON_HOME]
+    )
@@ -0,0 +1,162 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, IntegerField, Max, Q, Sum
+from django.db.models.functions import Cast, NullIf, TruncDate
+from django.utils import timezone
+
+from app.models import OrderLine, Review, DailyStat, ReportCursor
+
+# Разрез -> (поле id, поле названия) относительно продукта
+DIMENSIONS = {
+    DailyStat.PRODUCT: ('product_id', 'product__title'),
+    DailyStat.BRAND: ('product__brand_id', 'product__brand__title'),
+    DailyStat.CATEGORY: ('product__category_id', 'product__category__title'),
+    DailyStat.SPECIALITY: ('product__brand__speciality_id', 'product__brand__speciality__title'),
+}
+STARS = [f'stars_{value}' for value in range(1, 6)]
+METRICS = ['revenue', 'units', 'review_count', 'stars_sum'] + STARS
+# Колонки отчета и CSV в порядке вывода
+REPORT_FIELDS = ['key', 'title'] + METRICS + ['rating_avg']
+ORDERINGS = ('revenue', 'units', 'review_count', 'rating_avg')
+
+
+def _order_line_rows(first_id, last_id):
+    return OrderLine.objects.filter(pk__gte=first_id, pk__lte=last_id, product__isnull=False).annotate(
+        day=TruncDate('order__published_at'),
+    ).values('day', *[field for pair in DIMENSIONS.values() for field in pair]).annotate(
+        revenue=Sum('final_price'),
+        units=Sum('qty'),
+    ).order_by()
+
+
+def _review_rows(first_id, last_id):
+    return Review.objects.filter(pk__gte=first_id, pk__lte=last_id).annotate(
+        day=TruncDate('published_at'),
+    ).values('day', *[field for pair in DIMENSIONS.values() for field in pair]).annotate(
+        review_count=Count('pk'),
+        stars_sum=Sum(Cast('stars', IntegerField())),
+        **{name: Count('pk', filter=Q(stars=name[-1])) for name in STARS},
+    ).order_by()
+
+
+# Источник -> (модель, поле времени создания, группировка новых строк)
+SOURCES = {
+    'order_lines': (OrderLine, 'order__published_at', _order_line_rows),
+    'reviews': (Review, 'published_at', _review_rows),
+}
+
+
+def _merge(rows):
+    # Строки, сгруппированные по дню и продукту, раскладываются сразу по всем разрезам
+    totals = {}
+    for row in rows:
+        for dimension, (key_field, title_field) in DIMENSIONS.items():
+            if row[key_field] is None:
+                continue
+            item = totals.setdefault((dimension, row[key_field], row['day']), {'title': row[title_field]})
+            for metric in METRICS:
+                if metric in row:
+                    item[metric] = item.get(metric, 0) + (row[metric] or 0)
+    return totals
+
+
+def _save(totals):
+    stats = []
+    for dimension in DIMENSIONS:
+        keys = {(key, day) for dim, key, day in totals if dim == dimension}
+        if not keys:
+            continue
+        existing = DailyStat.objects.filter(
+            dimension=dimension,
+            key__in={key for key, _ in keys},
+            day__in={day for _, day in keys},
+        )
+        stats.extend(stat for stat in existing if (stat.key, stat.day) in keys)
+    found = {(stat.dimension, stat.key, stat.day): stat for stat in stats}
+    to_create = []
+    for identity, item in totals.items():
+        stat = found.get(identity)
+        if stat is None:
+            dimension, key, day = identity
+            stat = DailyStat(dimension=dimension, key=key, day=day)
+            to_create.append(stat)
+        stat.title = item['title'][:30]
+        for metric in METRICS:
+            if metric in item:
+                setattr(stat, metric, getattr(stat, metric) + item[metric])
+    if stats:
+        DailyStat.objects.bulk_update(stats, ['title'] + METRICS, batch_size=500)
+    if to_create:
+        DailyStat.objects.bulk_create(to_create, batch_size=500)
+
+
+def update_source(name, batch_size):
+    model, time_field, rows = SOURCES[name]
+    # Самые свежие строки пропускаются: транзакция с меньшим id может еще не зафиксироваться
+    settled = timezone.now() - timedelta(seconds=settings.REPORT_SETTLE_DELAY)
+    with transaction.atomic():
+        # Курсор блокируется, поэтому одну и ту же пачку не учтут дважды параллельные запуски
+        ReportCursor.objects.get_or_create(name=name)
+        cursor = ReportCursor.objects.select_for_update().get(name=name)
+        ids = list(model.objects.filter(
+            pk__gt=cursor.last_id, **{f'{time_field}__lte': settled},
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        _save(_merge(rows(ids[0], ids[-1])))
+        cursor.last_id = ids[-1]
+        cursor.save(update_fields=['last_id'])
+    return len(ids)
+
+
+def update_daily_stats(batch_size=None):
+    batch_size = batch_size or settings.REPORT_BATCH_SIZE
+    processed = dict.fromkeys(SOURCES, 0)
+    for name in SOURCES:
+        while True:
+            count = update_source(name, batch_size)
+            processed[name] += count
+            if count < batch_size:
+                break
+    return processed
+
+
+def rebuild_daily_stats(batch_size=None):
+    with transaction.atomic():
+        DailyStat.objects.all().delete()
+        # В той же таблице хранят позицию и другие подсистемы (рекомендации); сбрасываются только свои
+        ReportCursor.objects.filter(name__in=SOURCES).delete()
+    return update_daily_stats(batch_size)
+
+
+def _period(dimension, date_from, date_to):
+    # Отчеты читают только дневную статистику: индекс (dimension, day) отбирает строки периода
+    return DailyStat.objects.filter(dimension=dimension, day__range=(date_from, date_to))
+
+
+def _with_rating(row):
+    # Рейтинг для сортировки считает база, а в отчет идет округленное значение
+    row.pop('rating', None)
+    row['rating_avg'] = round(row['stars_sum'] / row['review_count'], 2) if row['review_count'] else None
+    return row
+
+
+def report_rows(dimension, date_from, date_to, ordering='revenue', limit=None):
+    rows = _period(dimension, date_from, date_to).values('key').annotate(
+        title=Max('title'),
+        **{metric: Sum(metric) for metric in METRICS},
+    ).annotate(
+        rating=ExpressionWrapper(
+            Cast(F('stars_sum'), FloatField()) / NullIf(F('review_count'), 0), output_field=FloatField(),
+        ),
+    ).order_by(F('rating' if ordering == 'rating_avg' else ordering).desc(nulls_last=True), 'key')
+    if limit:
+        rows = rows[:limit]
+    return [_with_rating(row) for row in rows]
+
+
+def report_totals(dimension, date_from, date_to):
+    totals = _period(dimension, date_from, date_to).aggregate(**{metric: Sum(metric) for metric in METRICS})
+    return _with_rating({metric: value or 0 for metric, value in totals.items()})
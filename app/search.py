@@ -0,0 +1,159 @@
+import difflib
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from app.models import Product, Company, Category
+
+FTS_TABLE = 'app_product_fts'
+VOCAB_TABLE = 'app_product_fts_vocab'
+# Веса колонок для bm25: title, description, brand, category
+BM25_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_search_index():
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"title, description, brand, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, row)')
+
+
+def _index_sql(where=''):
+    return (
+        f'INSERT INTO {FTS_TABLE}(rowid, title, description, brand, category) '
+        f"SELECT p.id, p.title, COALESCE(p.description, ''), b.title, c.title "
+        f'FROM {Product._meta.db_table} p '
+        f'JOIN {Company._meta.db_table} b ON b.id = p.brand_id '
+        f'JOIN {Category._meta.db_table} c ON c.id = p.category_id {where}'
+    )
+
+
+def index_products(column='id', value=None):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM {Product._meta.db_table} WHERE {column} = %s)',
+            [value],
+        )
+        cursor.execute(_index_sql(f'WHERE p.{column} = %s'), [value])
+
+
+def unindex_product(product_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_search_index():
+    ensure_search_index()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_index_sql())
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def tokenize(query):
+    return [token.lower() for token in TOKEN_RE.findall(query)]
+
+
+def correct_tokens(tokens):
+    corrected = []
+    with connection.cursor() as cursor:
+        for token in tokens:
+            cursor.execute(f'SELECT 1 FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s LIMIT 1',
+                           [token, token + '\uffff'])
+            if cursor.fetchone():
+                corrected.append(token)
+                continue
+            cursor.execute(f'SELECT term FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s',
+                           [token[0], chr(ord(token[0]) + 1)])
+            matches = difflib.get_close_matches(token, [row[0] for row in cursor.fetchall()], n=1, cutoff=0.7)
+            corrected.append(matches[0] if matches else token)
+    return corrected
+
+
+def _match_expression(tokens):
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _fts_search(tokens, brand, category, offset, limit):
+    filters, params = [], [_match_expression(tokens)]
+    if brand:
+        filters.append('AND p.brand_id = %s')
+        params.append(brand)
+    if category:
+        filters.append('AND p.category_id = %s')
+        params.append(category)
+    base = (
+        f'FROM {FTS_TABLE} f JOIN {Product._meta.db_table} p ON p.id = f.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s {" ".join(filters)}'
+    )
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) {base}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT p.id {base} ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s',
+            params + [limit, offset],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        facets = {}
+        for facet, table in (('category', Category._meta.db_table), ('brand', Company._meta.db_table)):
+            cursor.execute(
+                f'SELECT t.id, t.title, COUNT(*) FROM {FTS_TABLE} f '
+                f'JOIN {Product._meta.db_table} p ON p.id = f.rowid JOIN {table} t ON t.id = p.{facet}_id '
+                f'WHERE {FTS_TABLE} MATCH %s GROUP BY t.id, t.title ORDER BY COUNT(*) DESC',
+                params[:1],
+            )
+            facets[facet] = [{'id': pk, 'title': title, 'count': count} for pk, title, count in cursor.fetchall()]
+    products = Product.objects.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products], total, facets
+
+
+def _orm_search(tokens, brand, category, offset, limit):
+    condition = Q()
+    for token in tokens:
+        condition &= (Q(title__icontains=token) | Q(description__icontains=token) |
+                      Q(brand__title__icontains=token) | Q(category__title__icontains=token))
+    matched = Product.objects.filter(condition)
+    facets = {
+        facet: [
+            {'id': row[f'{facet}_id'], 'title': row[f'{facet}__title'], 'count': row['count']}
+            for row in matched.values(f'{facet}_id', f'{facet}__title').annotate(count=Count('pk')).order_by('-count')
+        ]
+        for facet in ('category', 'brand')
+    }
+    if brand:
+        matched = matched.filter(brand_id=brand)
+    if category:
+        matched = matched.filter(category_id=category)
+    return list(matched.order_by('-pk')[offset:offset + limit]), matched.count(), facets
+
+
+def search_products(query, brand=None, category=None, offset=0, limit=12):
+    tokens = tokenize(query)
+    if not tokens:
+        return {'products': [], 'total': 0, 'facets': {'category': [], 'brand': []}, 'corrected': None}
+    if not search_enabled():
+        products, total, facets = _orm_search(tokens, brand, category, offset, limit)
+        return {'products': products, 'total': total, 'facets': facets, 'corrected': None}
+    products, total, facets = _fts_search(tokens, brand, category, offset, limit)
+    corrected = None
+    if not total:
+        corrected_tokens = correct_tokens(tokens)
+        if corrected_tokens != tokens:
+            corrected = ' '.join(corrected_tokens)
+            products, total, facets = _fts_search(corrected_tokens, brand, category, offset, limit)
+    return {'products': products, 'total': total, 'facets': facets, 'corrected': corrected}
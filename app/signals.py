@@ -0,0 +1,202 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate, m2m_changed
+from django.dispatch import receiver
+
+from app.api import bump_catalog_version
+from app.cart import merge_session_cart
+from app.catalog_summaries import refresh_company_summaries, refresh_category_summaries
+from app.favorites import invalidate_favorites
+from app.fragment_cache import invalidate
+from app.images import generate_thumbnails
+from app.models import Product, Review, Company, Category, CartProduct, FavoriteProduct, CatalogVersion
+from app.search import ensure_search_index, index_products, unindex_product
+from app.summary import invalidate_user_summary
+from app.tasks import enqueue
+from app.utils import apply_rating_delta
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(user_logged_in)
+def merge_anon_cart(sender, request, user, **kwargs):
+    merge_session_cart(request.session, user)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._saved_rating = None
+    if instance.pk:
+        instance._saved_rating = Review.objects.filter(pk=instance.pk).values_list('product_id', 'stars').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, **kwargs):
+    saved_rating = getattr(instance, '_saved_rating', None)
+    if saved_rating == (instance.product_id, str(instance.stars)):
+        return
+    if saved_rating:
+        apply_rating_delta(*saved_rating, sign=-1)
+    apply_rating_delta(instance.product_id, instance.stars, sign=1)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_delta(instance.product_id, instance.stars, sign=-1)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_placement(sender, instance, **kwargs):
+    instance._saved_placement = None
+    if instance.pk:
+        instance._saved_placement = Product.objects.filter(pk=instance.pk).values_list(
+            'category_id', 'brand_id'
+        ).first()
+
+
+@receiver(post_migrate)
+def create_search_index(sender, **kwargs):
+    if sender.name == 'app':
+        ensure_search_index()
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    index_products('id', instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Company)
+def reindex_company_products(sender, instance, created, **kwargs):
+    if not created:
+        index_products('brand_id', instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:
+        index_products('category_id', instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_fragments(sender, instance, **kwargs):
+    # После коммита: иначе параллельный запрос отрисовал бы фрагмент по старым строкам под новой версией.
+    # Ключ собирается сразу: после удаления у instance уже нет pk
+    scope = f'product:{instance.pk}'
+    transaction.on_commit(lambda: invalidate(scope, 'products'))
+    bump_catalog_version(CatalogVersion.PRODUCTS)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_fragments(sender, instance, **kwargs):
+    scope = f'category:{instance.pk}'
+    transaction.on_commit(lambda: invalidate(scope, 'catalog'))
+    bump_catalog_version(CatalogVersion.CATEGORIES)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_fragments(sender, instance, **kwargs):
+    scope = f'company:{instance.pk}'
+    transaction.on_commit(lambda: invalidate(scope, 'catalog'))
+    bump_catalog_version(CatalogVersion.COMPANIES)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_fragments(sender, instance, **kwargs):
+    scope = f'product:{instance.product_id}'
+    transaction.on_commit(lambda: invalidate(scope))
+    # Отзыв меняет и рейтинг товара в API продуктов
+    bump_catalog_version(CatalogVersion.REVIEWS, CatalogVersion.PRODUCTS)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Company)
+def remember_image_upload(sender, instance, **kwargs):
+    image = instance.logo if sender is Company else instance.image
+    instance._image_uploaded = bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Company)
+def generate_uploaded_thumbnails(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        if sender is Company:
+            generate_thumbnails(instance.logo.name, settings.COMPANY_THUMBNAILS)
+        else:
+            generate_thumbnails(instance.image.name, settings.PRODUCT_THUMBNAILS)
+
+
+@receiver(post_save, sender=CartProduct)
+@receiver(post_delete, sender=CartProduct)
+def invalidate_summary_on_cart_change(sender, instance, **kwargs):
+    invalidate_user_summary(instance.user_id)
+
+
+@receiver(post_save, sender=FavoriteProduct)
+@receiver(post_delete, sender=FavoriteProduct)
+def invalidate_favorites_on_change(sender, instance, **kwargs):
+    invalidate_favorites(instance.owner_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_summaries_on_product_change(sender, instance, **kwargs):
+    # Пересчет сводки — агрегат по всем товарам бренда и категории, поэтому он уходит в фоновую задачу
+    company_ids, category_ids = {instance.brand_id}, {instance.category_id}
+    saved_placement = getattr(instance, '_saved_placement', None)
+    if saved_placement:
+        category_ids.add(saved_placement[0])
+        company_ids.add(saved_placement[1])
+    enqueue('refresh_summaries', company_ids=sorted(company_ids), category_ids=sorted(category_ids))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_summaries_on_review_change(sender, instance, **kwargs):
+    enqueue('refresh_catalog_summaries', product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=Company)
+def refresh_summary_on_company_save(sender, instance, created, **kwargs):
+    if created:
+        refresh_company_summaries([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def refresh_summaries_on_category_save(sender, instance, **kwargs):
+    # Название категории хранится в сводках компаний
+    refresh_category_summaries([instance.pk])
+    refresh_company_summaries(Category.brand.through.objects.filter(category_id=instance.pk).values_list(
+        'company_id', flat=True
+    ))
+
+
+@receiver(m2m_changed, sender=Category.brand.through)
+def refresh_summaries_on_brand_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_company_ids = set(instance.brand.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        refresh_company_summaries([instance.pk])
+    elif action == 'post_clear':
+        refresh_company_summaries(getattr(instance, '_cleared_company_ids', ()))
+    else:
+        refresh_company_summaries(pk_set)
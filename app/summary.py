@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from app.models import Cart, FavoriteProduct
+
+SUMMARY_KEY = 'user-summary:{user_id}'
+
+
+def _get_cache():
+    return caches[settings.USER_SUMMARY_CACHE_ALIAS]
+
+
+def _build_summary(user):
+    quantity, price = Cart.objects.filter(owner=user, in_order=False).values_list(
+        'final_quantity', 'final_price'
+    ).first() or (0, Decimal(0))
+    return {
+        'cart_quantity': quantity,
+        'cart_price': price,
+        'favorites_count': FavoriteProduct.objects.filter(owner=user).count(),
+    }
+
+
+def get_user_summary(user):
+    cache = _get_cache()
+    key = SUMMARY_KEY.format(user_id=user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _build_summary(user)
+        cache.set(key, summary, timeout=settings.USER_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_user_summary(user_id):
+    if user_id is None:
+        return
+    # Сброс после коммита: иначе параллельный запрос успеет положить в кэш еще старые значения
+    transaction.on_commit(lambda: _get_cache().delete(SUMMARY_KEY.format(user_id=user_id)))
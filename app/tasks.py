@@ -0,0 +1,112 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from app.catalog_summaries import (
+    refresh_company_summaries, refresh_category_summaries, refresh_product_summaries,
+)
+from app.models import Task, Order
+
+logger = logging.getLogger('app.tasks')
+
+registry = {}
+
+
+def task(func):
+    registry[func.__name__] = func
+    return func
+
+
+def enqueue(name, **payload):
+    # Задача пишется в ту же транзакцию, что и данные, для которых она создана:
+    # если транзакция откатится, задача не появится
+    if name not in registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    return Task.objects.create(name=name, payload=payload)
+
+
+def reclaim_abandoned():
+    # Задачи в статусе RUNNING дольше TASK_LEASE_TIMEOUT возвращаются в очередь как неудачная попытка:
+    # так задача, которая роняет воркер, не будет перезапускаться бесконечно
+    tasks = Task.objects.filter(
+        status=Task.RUNNING, started_at__lte=timezone.now() - timedelta(seconds=settings.TASK_LEASE_TIMEOUT),
+    )
+    error = 'Воркер не завершил задачу за TASK_LEASE_TIMEOUT'
+    failed = tasks.filter(attempts__gte=settings.TASK_MAX_ATTEMPTS - 1).update(
+        status=Task.FAILED, attempts=F('attempts') + 1, last_error=error,
+    )
+    return failed + tasks.update(status=Task.NEW, attempts=F('attempts') + 1, last_error=error, run_at=timezone.now())
+
+
+def purge_done():
+    # Задачи ставятся на каждое изменение товара и отзыва, поэтому выполненные не копятся в таблице
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_DONE_RETENTION)
+    return Task.objects.filter(status=Task.DONE, started_at__lte=cutoff).delete()[0]
+
+
+def run_pending(limit=100):
+    reclaim_abandoned()
+    purge_done()
+    processed = 0
+    ids = list(
+        Task.objects.filter(status=Task.NEW, run_at__lte=timezone.now())
+        .order_by('run_at').values_list('pk', flat=True)[:limit]
+    )
+    for pk in ids:
+        # Захват задачи одним UPDATE: если ее уже взял другой воркер, rowcount будет 0
+        if not Task.objects.filter(pk=pk, status=Task.NEW).update(status=Task.RUNNING, started_at=timezone.now()):
+            continue
+        run_task(Task.objects.get(pk=pk))
+        processed += 1
+    return processed
+
+
+def run_task(task_obj):
+    try:
+        registry[task_obj.name](**task_obj.payload)
+    except Exception as error:
+        attempts = task_obj.attempts + 1
+        failed = attempts >= settings.TASK_MAX_ATTEMPTS
+        logger.exception('Задача %s #%s завершилась ошибкой', task_obj.name, task_obj.pk)
+        Task.objects.filter(pk=task_obj.pk).update(
+            status=Task.FAILED if failed else Task.NEW,
+            attempts=attempts,
+            last_error=repr(error),
+            run_at=timezone.now() + timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** task_obj.attempts),
+        )
+    else:
+        Task.objects.filter(pk=task_obj.pk).update(status=Task.DONE, attempts=task_obj.attempts + 1)
+
+
+@task
+def send_order_confirmation(order_id):
+    order = Order.objects.prefetch_related('lines').get(pk=order_id)
+    send_mail(
+        f'Заказ №{order.pk} оформлен',
+        render_to_string('emails/order_confirmation.txt', {'order': order}),
+        settings.DEFAULT_FROM_EMAIL,
+        [order.email],
+    )
+
+
+@task
+def notify_admins_about_order(order_id):
+    order = Order.objects.select_related('owner').prefetch_related('lines').get(pk=order_id)
+    mail_admins(f'Новый заказ №{order.pk}', render_to_string('emails/order_admin.txt', {'order': order}))
+
+
+@task
+def refresh_catalog_summaries(product_ids):
+    refresh_product_summaries(product_ids)
+
+
+@task
+def refresh_summaries(company_ids, category_ids):
+    # Ставится сигналом изменения товара: id берутся до и после переноса, товар к этому времени может быть удален
+    refresh_company_summaries(company_ids)
+    refresh_category_summaries(category_ids)
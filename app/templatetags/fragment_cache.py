@@ -0,0 +1,41 @@
+from django import template
+
+from app.fragment_cache import get_or_render, scope_for
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, scopes, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.scopes = scopes
+        self.vary = vary
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        scopes = [scope_for(scope.resolve(context)) for scope in self.scopes]
+        vary = tuple(str(value.resolve(context)) for value in self.vary)
+        return get_or_render(name, scopes, vary, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    {% cachefragment 'имя' scope1 scope2 vary=value %}...{% endcachefragment %}
+
+    scope — строка или объект модели; сохранение/удаление объекта меняет версию scope,
+    и все фрагменты, зависящие от него, перестают находиться в кэше.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]} ожидает имя фрагмента и хотя бы один scope')
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    scopes, vary = [], []
+    for bit in bits[2:]:
+        if bit.startswith('vary='):
+            vary.append(parser.compile_filter(bit[len('vary='):]))
+        else:
+            scopes.append(parser.compile_filter(bit))
+    return CacheFragmentNode(nodelist, parser.compile_filter(bits[1]), scopes, vary)
@@ -0,0 +1,34 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from app.images import SCALES, thumbnail_name, webp_supported
+
+register = template.Library()
+
+
+def _srcset(name, size, fmt):
+    return ', '.join(
+        f'{default_storage.url(thumbnail_name(name, size, scale, fmt))} {scale}x' for scale in SCALES
+    )
+
+
+@register.simple_tag
+def responsive_image(image, size, css_class='', alt=''):
+    width, height = settings.THUMBNAIL_SIZES[size]
+    if not image:
+        return ''
+    if not default_storage.exists(thumbnail_name(image.name, size)):
+        return format_html(
+            '<img class="{}" style="width: {}px; height: {}px;" src="{}" alt="{}" loading="lazy">',
+            css_class, width, height, image.url, alt,
+        )
+    webp_source = ''
+    if webp_supported():
+        webp_source = format_html('<source type="image/webp" srcset="{}">', _srcset(image.name, size, 'webp'))
+    return format_html(
+        '<picture>{}<img class="{}" width="{}" height="{}" src="{}" srcset="{}" alt="{}" loading="lazy"></picture>',
+        webp_source, css_class, width, height,
+        default_storage.url(thumbnail_name(image.name, size)), _srcset(image.name, size, 'jpg'), alt,
+    )
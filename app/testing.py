@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from app.query_stats import QueryRecorder
+
+BUDGETED_URLCONFS = ('app.urls', 'users.urls')
+
+
+def named_urls(urlconfs=BUDGETED_URLCONFS):
+    names = set()
+    for urlconf in urlconfs:
+        for pattern in get_resolver(urlconf).url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+            elif isinstance(pattern, URLResolver):
+                names |= {name for name in pattern.reverse_dict if isinstance(name, str)}
+    return names
+
+
+class QueryBudgetMixin:
+    """
+    Примесь для TestCase: query_budgets = {'имя url': максимум запросов}.
+    assertAllUrlsBudgeted падает, если в app/urls.py или users/urls.py появился маршрут без бюджета.
+    """
+    query_budgets = {}
+
+    def assertAllUrlsBudgeted(self):
+        missing = named_urls() - set(self.query_budgets)
+        self.assertFalse(missing, f'Не задан бюджет запросов для: {", ".join(sorted(missing))}')
+
+    def assertQueryBudget(self, url_name, path, method='get', data=None, budget=None):
+        budget = self.query_budgets[url_name] if budget is None else budget
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = getattr(self.client, method)(path, data)
+        duplicates = recorder.duplicates(settings.QUERY_STATS_DUPLICATE_THRESHOLD)
+        message = f'{url_name} ({path}): {recorder.count} запросов при бюджете {budget}'
+        if duplicates:
+            message += '\nПовторяющиеся запросы:\n' + '\n'.join(f'x{count}: {sql}' for sql, count in duplicates)
+        self.assertLessEqual(recorder.count, budget, message)
+        return response
@@ -1,3 +1,893 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.checks import run_checks
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from app import async_views, inventory
+from app.cart import SESSION_CART_KEY, add_to_cart, get_user_cart
+from app.checkout import place_order
+from app.favorites import add_favorites
+from app.forms import ProductFilterForm
+from app.middleware import show_toolbar
+from app.images import SCALES, thumbnail_name, webp_supported
+from app.fragment_cache import get_stats, get_versions, record, reset_stats
+from app.query_stats import QueryRecorder, QueryStats, get_query_stats, reset_query_stats
+from app.models import (
+    Product, Company, Category, Speciality, Cart, CartProduct, CoOccurrence, Review, Reservation, Task,
+    CategorySummary, CompanySummary, DailyStat,
+)
+from app.recommendations import bought_together, update_recommendations
+from app.reports import rebuild_daily_stats, report_rows, report_totals, update_daily_stats
+from app.summary import get_user_summary
+from app.tasks import enqueue, run_pending
+from app.testing import QueryBudgetMixin
+from app.pagination import KeysetPaginator, encode_cursor
+from app.utils import related_products
+from app.views import CategoryDetailView, DetailProductView
+
+
+class ShopFixture:
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('bob', password='pw12345!x', first_name='Bob')
+        speciality = Speciality.objects.create(title='Tech')
+        self.company = Company.objects.create(
+            title='Apple', owner=self.user, logo='company_images/m1_book.jpg', speciality=speciality,
+        )
+        self.category = Category.objects.create(title='Phones')
+        self.category.brand.add(self.company)
+        self.products = [
+            Product.objects.create(
+                title=f'iPhone {i}', image='products_images/mac_mini.jpg', price=Decimal('10.50') + i,
+                brand=self.company, category=self.category, description='nice phone', stock=10,
+            )
+            for i in range(5)
+        ]
+
+
+class ShopTestCase(ShopFixture, TestCase):
+    pass
+
+
+# Кэши сбрасываются в transaction.on_commit, который внутри TestCase не вызывается
+class ShopTransactionTestCase(ShopFixture, TransactionTestCase):
+    pass
+
+
+class OrderViewTests(ShopTestCase):
+    def test_anonymous_order_page_redirects_to_login(self):
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        response = self.client.get('/order/')
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+
+    def test_order_page_lists_cart_lines(self):
+        self.client.force_login(self.user)
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        response = self.client.get('/order/')
+        self.assertContains(response, 'iPhone 0')
+
+
+class ChangeQtyTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        self.line = CartProduct.objects.get()
+
+    def test_zero_removes_line(self):
+        response = self.client.post(f'/change-qty/{self.line.pk}', {'number': 0})
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+        self.assertFalse(CartProduct.objects.exists())
+        self.assertFalse(Reservation.objects.exists())
+        cart = get_user_cart(self.user)
+        self.assertEqual((cart.final_quantity, cart.final_price), (0, 0))
+
+    def test_invalid_qty_shows_error(self):
+        response = self.client.post(f'/change-qty/{self.line.pk}', {'number': -1}, follow=True)
+        self.assertEqual(len(list(response.context['messages'])), 1)
+        self.line.refresh_from_db()
+        self.assertEqual(self.line.qty, 1)
+
+
+class CartLineTests(ShopTestCase):
+    def lines(self, cart):
+        return dict(cart.products.values_list('product_id', 'qty'))
+
+    def test_repeated_adds_increment_one_line(self):
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        cart = get_user_cart(self.user)
+        self.assertEqual(self.lines(cart), {self.products[0].pk: 3})
+        line = cart.products.get()
+        self.assertEqual(line.final_price, self.products[0].price * 3)
+        self.assertEqual((cart.final_quantity, cart.final_price), (3, line.final_price))
+
+    def test_batch_add_writes_lines_in_two_statements(self):
+        cart = get_user_cart(self.user)
+        add_to_cart(cart, self.user, {self.products[0]: 1})
+        with CaptureQueriesContext(connection) as queries:
+            add_to_cart(cart, self.user, {self.products[0]: 2, self.products[1]: 1})
+        line_queries = [query['sql'] for query in queries if '"app_cartproduct"' in query['sql']]
+        self.assertEqual([sql.split()[0] for sql in line_queries], ['INSERT', 'UPDATE'])
+        self.assertEqual(self.lines(cart), {self.products[0].pk: 3, self.products[1].pk: 1})
+        self.assertEqual(get_user_cart(self.user).final_quantity, 4)
+
+    def test_line_is_unique_per_cart_and_product(self):
+        cart = get_user_cart(self.user)
+        add_to_cart(cart, self.user, {self.products[0]: 1})
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartProduct.objects.create(cart=cart, product=self.products[0], user=self.user, qty=1, final_price=0)
+
+
+class SessionCartTests(ShopTestCase):
+    def test_anonymous_cart_lives_in_session(self):
+        carts = Cart.objects.count()
+        for _ in range(2):
+            self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        self.client.get('/')
+        self.assertEqual(Cart.objects.count(), carts)
+        self.assertEqual(self.client.session[SESSION_CART_KEY], {str(self.products[0].pk): 2})
+
+    def test_session_cart_is_merged_on_login(self):
+        add_to_cart(get_user_cart(self.user), self.user, {self.products[0]: 1})
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        self.client.get(f'/add-to-cart/product/{self.products[1].pk}')
+        self.client.post('/login/', {'username': 'bob', 'password': 'pw12345!x'})
+        cart = get_user_cart(self.user)
+        self.assertEqual(
+            dict(cart.products.values_list('product_id', 'qty')), {self.products[0].pk: 2, self.products[1].pk: 1},
+        )
+        self.assertEqual(cart.final_quantity, 3)
+        self.assertNotIn(SESSION_CART_KEY, self.client.session)
+
+    def test_purge_removes_only_anonymous_carts(self):
+        Cart.objects.bulk_create([Cart(anon=True) for _ in range(3)])
+        cart = get_user_cart(self.user)
+        call_command('purge_anon_carts', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(list(Cart.objects.all()), [cart])
+
+
+class ReconcileCartTotalsTests(ShopTestCase):
+    def test_drifted_totals_are_recomputed_from_lines(self):
+        cart = get_user_cart(self.user)
+        add_to_cart(cart, self.user, {self.products[0]: 2, self.products[1]: 1})
+        Cart.objects.filter(pk=cart.pk).update(final_quantity=99, final_price=0)
+        out = io.StringIO()
+        call_command('reconcile_cart_totals', '--dry-run', stdout=out)
+        self.assertIn('найдено расхождений: 1', out.getvalue())
+        call_command('reconcile_cart_totals', stdout=out)
+        cart.refresh_from_db()
+        self.assertEqual((cart.final_quantity, cart.final_price), (3, Decimal('32.50')))
+
+
+class KeysetPaginationTests(ShopTestCase):
+    def walk(self, ordering, per_page=2):
+        paginator = KeysetPaginator(Product.objects.all(), ordering, per_page)
+        cursor, seen = None, []
+        while True:
+            page = paginator.get_page(cursor)
+            seen += [product.pk for product in page]
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_with_ties(self):
+        Product.objects.filter(pk__in=[product.pk for product in self.products[:3]]).update(price=Decimal('5'))
+        for ordering in ProductFilterForm.SORT_ORDERING.values():
+            with self.subTest(ordering):
+                expected = list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(self.walk(ordering), expected)
+
+    def test_malformed_cursor_starts_from_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('price', 'pk'), 2)
+        first = list(paginator.get_page())
+        for cursor in ('garbage', encode_cursor([1]), encode_cursor(['abc', 'x']), encode_cursor({'a': 1})[:-2]):
+            with self.subTest(cursor):
+                self.assertEqual(list(paginator.get_page(cursor)), first)
+
+    def test_last_page_has_no_cursor(self):
+        page = KeysetPaginator(Product.objects.all(), ('-pk',), len(self.products)).get_page()
+        self.assertEqual((len(page), page.next_cursor), (len(self.products), None))
+
+    def test_category_filters(self):
+        Product.objects.filter(pk=self.products[2].pk).update(availability=False)
+        response = self.client.get(f'/category/{self.category.pk}', {
+            'price_min': '11', 'price_max': '13.5', 'available': 'on', 'brand': self.company.pk, 'sort': '-price',
+        })
+        self.assertEqual(list(response.context['products']), [self.products[3], self.products[1]])
+        self.assertTrue(response.context['is_first_page'])
+
+
+class SearchViewTests(ShopTestCase):
+    def test_non_integer_filters_are_ignored(self):
+        response = self.client.get('/search/', {'q': 'iPhone', 'brand': 'abc', 'category': '1x', 'page': '-2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], len(self.products))
+        self.assertIsNone(response.context['brand'])
+
+    def test_brand_filter(self):
+        response = self.client.get('/search/', {'q': 'iPhone', 'brand': self.company.pk + 1})
+        self.assertEqual(response.context['total'], 0)
+
+
+class UserSummaryTests(ShopTransactionTestCase):
+    def test_summary_is_cached_until_cart_or_favorites_change(self):
+        get_user_summary(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_summary(self.user)['cart_quantity'], 0)
+        add_to_cart(get_user_cart(self.user), self.user, {self.products[0]: 2})
+        add_favorites(self.user, [self.products[1].pk])
+        summary = get_user_summary(self.user)
+        self.assertEqual(
+            (summary['cart_quantity'], summary['cart_price'], summary['favorites_count']), (2, Decimal('21.00'), 1),
+        )
+
+    def test_badges_in_navigation(self):
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        self.assertContains(self.client.get('/catalog/'), '<span class="badge badge-light">1</span>', html=True)
+        self.client.force_login(self.user)
+        add_favorites(self.user, [self.products[0].pk, self.products[1].pk])
+        response = self.client.get('/catalog/')
+        self.assertContains(response, '<span class="badge badge-secondary">2</span>', html=True)
+
+
+class FavoriteButtonTests(ShopTestCase):
+    def test_button_toggles_on_home_and_category(self):
+        self.client.force_login(self.user)
+        add_favorites(self.user, [self.products[0].pk])
+        for url in ('/', f'/category/{self.category.pk}'):
+            response = self.client.get(url)
+            self.assertContains(response, 'title="Убрать из избранного"', count=1)
+            self.assertContains(response, 'title="В избранное"', count=len(self.products) - 1)
+
+    def test_anonymous_sees_no_button(self):
+        response = self.client.get(f'/category/{self.category.pk}')
+        self.assertNotContains(response, 'В избранное')
+
+
+class AdminInputFilterTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', password='pw12345!x'))
+
+    def test_non_numeric_id_is_rejected_without_error(self):
+        for url in ('/admin/app/cartproduct/?product_id=abc', '/admin/app/order/?cart_id=x'):
+            response = self.client.get(url)
+            self.assertRedirects(response, url.split('?')[0] + '?e=1', fetch_redirect_response=False)
+
+    def test_numeric_id_filters(self):
+        response = self.client.get(f'/admin/app/review/?product_id={self.products[0].pk}')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REPORT_SETTLE_DELAY=0)
+class RecommendationTests(ShopTestCase):
+    def place_order(self, *products):
+        cart = get_user_cart(self.user)
+        add_to_cart(cart, self.user, {product: 1 for product in products})
+        return place_order(cart, self.user, {
+            'first_name': 'Bob', 'last_name': 'Smith', 'address': 'Street', 'phone': '1', 'email': 'bob@example.com',
+            'comment': '', 'date_at': timezone.localdate(),
+        })
+
+    def test_reports_rebuild_keeps_recommendation_cursor(self):
+        self.place_order(self.products[0], self.products[1])
+        update_recommendations()
+        rebuild_daily_stats()
+        update_recommendations()
+        pair = CoOccurrence.objects.get(product_a=self.products[0], product_b=self.products[1])
+        self.assertEqual(pair.orders, 1)
+
+    def test_bought_together_skips_unavailable_products(self):
+        self.place_order(self.products[0], self.products[1], self.products[2])
+        update_recommendations()
+        self.products[1].stock = 0
+        self.products[1].save()
+        self.assertEqual(bought_together(self.products[0].pk), [self.products[2]])
+
+
+@override_settings(REPORT_SETTLE_DELAY=0)
+class DailyReportTests(ShopTestCase):
+    place_order = RecommendationTests.place_order
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.place_order(self.products[0], self.products[1])
+        self.place_order(self.products[0])
+        other = User.objects.create_user('alice', password='pw12345!x')
+        Review.objects.create(product=self.products[0], owner=self.user, stars='5', text='Отлично')
+        Review.objects.create(product=self.products[0], owner=other, stars='2', text='Так себе')
+
+    def rows(self, dimension, ordering='revenue'):
+        return report_rows(dimension, self.today, self.today, ordering=ordering)
+
+    def test_rollups_per_dimension(self):
+        update_daily_stats()
+        first, second = self.rows(DailyStat.PRODUCT)
+        self.assertEqual((first['key'], first['revenue'], first['units']), (self.products[0].pk, Decimal('21.00'), 2))
+        self.assertEqual((first['review_count'], first['stars_5'], first['stars_2']), (2, 1, 1))
+        self.assertEqual(first['rating_avg'], 3.5)
+        self.assertEqual((second['key'], second['revenue'], second['rating_avg']),
+                         (self.products[1].pk, Decimal('11.50'), None))
+        [brand] = self.rows(DailyStat.BRAND)
+        self.assertEqual((brand['title'], brand['revenue'], brand['units']), ('Apple', Decimal('32.50'), 3))
+
+    def test_totals_and_rating_ordering(self):
+        update_daily_stats()
+        totals = report_totals(DailyStat.PRODUCT, self.today, self.today)
+        self.assertEqual((totals['revenue'], totals['units'], totals['review_count']), (Decimal('32.50'), 3, 2))
+        self.assertEqual(totals['rating_avg'], 3.5)
+        self.assertEqual([row['key'] for row in self.rows(DailyStat.PRODUCT, 'rating_avg')],
+                         [self.products[0].pk, self.products[1].pk])
+        yesterday = self.today - timedelta(days=1)
+        self.assertEqual(report_totals(DailyStat.PRODUCT, yesterday, yesterday),
+                         dict.fromkeys(totals, 0) | {'rating_avg': None})
+
+    def test_updates_are_incremental_and_rebuild_is_idempotent(self):
+        self.assertEqual(update_daily_stats(batch_size=1), {'order_lines': 3, 'reviews': 2})
+        self.assertEqual(update_daily_stats(), {'order_lines': 0, 'reviews': 0})
+        self.place_order(self.products[1])
+        update_daily_stats()
+        rebuild_daily_stats()
+        rebuild_daily_stats()
+        [brand] = self.rows(DailyStat.BRAND)
+        self.assertEqual((brand['revenue'], brand['units'], brand['review_count']), (Decimal('44.00'), 4, 2))
+
+
+class FragmentCacheTests(ShopTestCase):
+    def test_stats_count_every_fragment(self):
+        for name in ('menu', 'grid', 'menu'):
+            record(name, 'miss')
+        record('grid', 'hit')
+        self.assertEqual(get_stats(), {'grid': {'hit': 1, 'miss': 1}, 'menu': {'hit': 0, 'miss': 2}})
+        reset_stats()
+        self.assertEqual(get_stats(), {})
+
+    def test_deploy_check_rejects_process_local_caches(self):
+        errors = run_checks(include_deployment_checks=True, tags=['caches'])
+        self.assertIn('app.E001', [error.id for error in errors])
+
+
+class FragmentInvalidationTests(ShopTransactionTestCase):
+    def test_versions_change_after_commit(self):
+        scopes = [f'product:{self.products[0].pk}', 'products']
+        versions = get_versions(scopes)
+        with transaction.atomic():
+            self.products[0].title = 'iPhone X'
+            self.products[0].save()
+            self.assertEqual(get_versions(scopes), versions)
+        self.assertTrue(all(new != old for new, old in zip(get_versions(scopes), versions)))
+
+    def test_deleted_product_scope_is_invalidated(self):
+        scope = f'product:{self.products[0].pk}'
+        version = get_versions([scope])
+        self.products[0].delete()
+        self.assertNotEqual(get_versions([scope]), version)
+
+
+@override_settings(LOGIN_THROTTLE={'ip': (100, 60), 'username': (2, 60)})
+class LoginThrottleTests(ShopTestCase):
+    def test_login_is_rejected_after_limit(self):
+        for _ in range(2):
+            self.client.post('/login/', {'username': 'bob', 'password': 'wrong'})
+        response = self.client.post('/login/', {'username': 'bob', 'password': 'pw12345!x'})
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_deploy_check_rejects_process_local_counters(self):
+        errors = run_checks(include_deployment_checks=True, tags=['security'])
+        self.assertIn('users.E001', [error.id for error in errors])
+
+
+class UserCacheTests(ShopTransactionTestCase):
+    def test_sessions_of_model_backend_stay_valid(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get('/profile/')
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_failed_login_hashes_password_once(self):
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as check, \
+                mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as make:
+            self.assertIsNone(authenticate(username='bob', password='wrong'))
+            self.assertIsNone(authenticate(username='nobody', password='wrong'))
+        self.assertEqual((check.call_count, make.call_count), (1, 1))
+        self.assertEqual(authenticate(username='bob', password='pw12345!x'), self.user)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.force_login(self.user)
+        self.client.get('/')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/')
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+class ProductRatingTests(ShopTestCase):
+    def rating(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        return product.rating_count, product.rating_avg, product.rating_histogram
+
+    def test_rating_follows_review_changes(self):
+        other = User.objects.create_user('alice', password='pw12345!x')
+        review = Review.objects.create(product=self.products[0], owner=self.user, stars='5', text='Отлично')
+        Review.objects.create(product=self.products[0], owner=other, stars='2', text='Так себе')
+        self.assertEqual(self.rating(), (2, Decimal('3.50'), [(5, 1), (4, 0), (3, 0), (2, 1), (1, 0)]))
+        review.stars = '4'
+        review.save()
+        self.assertEqual(self.rating(), (2, Decimal('3.00'), [(5, 0), (4, 1), (3, 0), (2, 1), (1, 0)]))
+        review.delete()
+        self.assertEqual(self.rating(), (1, Decimal('2.00'), [(5, 0), (4, 0), (3, 0), (2, 1), (1, 0)]))
+
+    def test_rebuild_ratings_repairs_drift(self):
+        Review.objects.create(product=self.products[0], owner=self.user, stars='3', text='Нормально')
+        Product.objects.filter(pk=self.products[0].pk).update(rating_count=0, rating_sum=0, rating_avg=0, rating_3=0)
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        self.assertEqual(self.rating(), (1, Decimal('3.00'), [(5, 0), (4, 0), (3, 1), (2, 0), (1, 0)]))
+
+    def test_reviews_are_paginated(self):
+        for i in range(12):
+            user = User.objects.create_user(f'user{i}')
+            Review.objects.create(product=self.products[0], owner=user, stars='4', text='Хорошо')
+        response = self.client.get(f'/products/{self.products[0].pk}?page=2')
+        self.assertEqual(len(response.context['reviews']), 12 - DetailProductView.reviews_per_page)
+
+
+class ThumbnailTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name='phone.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'PNG')
+        product = self.products[0]
+        # Как при загрузке через форму админки: файл сохраняется вместе с моделью
+        product.image = ContentFile(buffer.getvalue(), name=name)
+        product.save()
+        return product
+
+    def test_upload_generates_every_size_and_scale(self):
+        product = self.upload()
+        for size in settings.PRODUCT_THUMBNAILS:
+            width, height = settings.THUMBNAIL_SIZES[size]
+            for scale in SCALES:
+                with default_storage.open(thumbnail_name(product.image.name, size, scale)) as file:
+                    self.assertEqual(Image.open(file).size, (width * scale, height * scale))
+                if webp_supported():
+                    self.assertTrue(default_storage.exists(thumbnail_name(product.image.name, size, scale, 'webp')))
+
+    def test_tag_serves_srcset_and_falls_back_to_original(self):
+        template = Template('{% load images %}{% responsive_image product.image "card" %}')
+        product = self.upload()
+        html = template.render(Context({'product': product}))
+        self.assertIn('srcset=', html)
+        self.assertIn(default_storage.url(thumbnail_name(product.image.name, 'card', 2)) + ' 2x', html)
+        default_storage.delete(thumbnail_name(product.image.name, 'card'))
+        html = template.render(Context({'product': product}))
+        self.assertNotIn('srcset=', html)
+        self.assertIn(product.image.url, html)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Профиль SQLite')
+class SqliteProfileTests(ShopTestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_hot_lookups_use_indexes(self):
+        for queryset in (
+            Cart.objects.filter(owner=self.user, in_order=False),
+            CartProduct.objects.filter(user=self.user).order_by('id'),
+            Review.objects.filter(product=self.products[0], owner=self.user),
+        ):
+            with self.subTest(queryset.model.__name__):
+                self.assertIn('USING', self.query_plan(queryset))
+
+    def test_one_open_cart_per_user(self):
+        cart = get_user_cart(self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(owner=self.user)
+        self.assertEqual(get_user_cart(self.user), cart)
+
+
+class ApiTests(ShopTestCase):
+    def test_etag_follows_catalog_version_in_database(self):
+        url = f'/api/v1/products/{self.products[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.products[0].price = Decimal('99')
+        self.products[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_versions_are_kept_per_resource(self):
+        products, categories = '/api/v1/products/', '/api/v1/categories/'
+        etags = {url: self.client.get(url)['ETag'] for url in (products, categories)}
+        inventory.reserve(get_user_cart(self.user), {self.products[0]: 10})
+        self.category.title = 'Mobiles'
+        self.category.save()
+        self.assertEqual(self.client.get(products, HTTP_IF_NONE_MATCH=etags[products]).status_code, 304)
+        self.assertEqual(self.client.get(categories, HTTP_IF_NONE_MATCH=etags[categories]).status_code, 200)
+
+    def test_review_author_is_display_name(self):
+        Review.objects.create(product=self.products[0], owner=self.user, stars='5', text='Отлично')
+        response = self.client.get(f'/api/v1/products/{self.products[0].pk}/reviews/')
+        self.assertEqual(response.json()['results'][0]['author'], 'Bob')
+        self.assertNotIn('bob', response.content.decode())
+
+
+class AsyncViewTests(ShopTransactionTestCase):
+    def render(self, view, path, **kwargs):
+        request = RequestFactory().get(path)
+        request.user = self.user
+        request.session = {}
+        return async_to_sync(view)(request, **kwargs).content.decode()
+
+    def test_catalog_fragment_is_rendered_with_data_after_eviction(self):
+        self.assertIn('Apple', self.render(async_views.catalog_view, '/catalog/'))
+        caches['fragments'].clear()
+        self.assertIn('Apple', self.render(async_views.catalog_view, '/catalog/'))
+
+    @mock.patch.object(CategoryDetailView, 'products_per_page', 2)
+    def test_category_page_links_match_sync_view(self):
+        path = f'/category/{self.category.pk}?sort=price'
+        content = self.render(async_views.category_detail_view, path, pk=self.category.pk)
+        self.client.force_login(self.user)
+        response = self.client.get(path)
+        self.assertIn(response.context['next_page_url'].replace('&', '&amp;'), content)
+
+    def test_product_page_renders_reviews(self):
+        Review.objects.create(product=self.products[0], owner=self.user, stars='5', text='Отличный телефон')
+        content = self.render(async_views.detail_product_view, '/products/', pk=self.products[0].pk)
+        self.assertIn('Отличный телефон', content)
+
+
+class QueryBudgetTests(QueryBudgetMixin, ShopTestCase):
+    # Бюджеты при пустых кэшах фрагментов и сводок, с товаром в корзине; маршрут без бюджета роняет
+    # test_every_route_has_budget
+    query_budgets = {
+        'home': 6,
+        'catalog': 4,
+        'detail_company': 3,
+        'detail_category': 7,
+        'detail_product': 8,
+        'search': 7,
+        'cart': 4,
+        'favorites': 4,
+        'order': 4,
+        'profile': 2,
+        'cart-add': 14,
+        # Резерв списывает остаток условным UPDATE на каждую строку: здесь 4 товара
+        'cart-add-many': 20,
+        'delete_from_cart': 13,
+        'qty': 13,
+        'favorites-add': 2,
+        'favorites-del': 2,
+        'favorites-add-many': 2,
+        'favorites-del-many': 3,
+        'api-products': 2,
+        'api-product': 2,
+        'api-product-reviews': 2,
+        'api-categories': 2,
+        'api-category': 2,
+        'api-companies': 2,
+        'api-company': 2,
+        'login': 9,
+        'reg': 0,
+        'logout': 2,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.client.get(f'/add-to-cart/product/{self.products[0].pk}')
+        # Число запросов не должно расти с числом товаров, отзывов и избранного
+        for product in self.products:
+            Review.objects.create(product=product, owner=self.user, stars='4', text='Хорошо')
+        add_favorites(self.user, [product.pk for product in self.products])
+
+    def clear_caches(self):
+        for alias in ('fragments', 'summaries'):
+            caches[alias].clear()
+
+    def test_every_route_has_budget(self):
+        self.assertAllUrlsBudgeted()
+
+    def test_main_pages(self):
+        pages = {
+            'home': '/',
+            'catalog': '/catalog/',
+            'detail_company': f'/comapny/{self.company.pk}/',
+            'detail_category': f'/category/{self.category.pk}',
+            'detail_product': f'/products/{self.products[0].pk}',
+            'search': '/search/?q=iPhone',
+            'cart': '/cart/',
+            'favorites': '/favorites/',
+            'order': '/order/',
+            'profile': '/profile/',
+            'api-products': '/api/v1/products/',
+            'api-product': f'/api/v1/products/{self.products[0].pk}/',
+            'api-product-reviews': f'/api/v1/products/{self.products[0].pk}/reviews/',
+            'api-categories': '/api/v1/categories/',
+            'api-category': f'/api/v1/categories/{self.category.pk}/',
+            'api-companies': '/api/v1/companies/',
+            'api-company': f'/api/v1/companies/{self.company.pk}/',
+        }
+        for url_name, path in pages.items():
+            self.clear_caches()
+            with self.subTest(url_name):
+                response = self.assertQueryBudget(url_name, path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_cart_and_favorites_actions(self):
+        line = CartProduct.objects.get()
+        products = [str(product.pk) for product in self.products[1:]]
+        actions = [
+            ('cart-add', f'/add-to-cart/product/{self.products[1].pk}', 'get', None),
+            ('cart-add-many', '/add-to-cart/', 'post', {'product': products}),
+            ('qty', f'/change-qty/{line.pk}', 'post', {'number': 2}),
+            ('delete_from_cart', f'/delete/from/cart/{line.pk}', 'get', None),
+            ('favorites-del', f'/del-from-favorites/product/{self.products[0].pk}', 'get', None),
+            ('favorites-add', f'/add-to-favorites/product/{self.products[0].pk}', 'get', None),
+            ('favorites-del-many', '/del-from-favorites/', 'post', {'product': products}),
+            ('favorites-add-many', '/add-to-favorites/', 'post', {'product': products}),
+        ]
+        for url_name, path, method, data in actions:
+            self.clear_caches()
+            with self.subTest(url_name):
+                response = self.assertQueryBudget(url_name, path, method, data)
+                self.assertEqual(response.status_code, 302)
+
+    def test_auth_pages(self):
+        self.assertQueryBudget('logout', '/logout/')
+        self.assertEqual(self.assertQueryBudget('reg', '/registration/').status_code, 200)
+        response = self.assertQueryBudget('login', '/login/', 'post', {'username': 'bob', 'password': 'pw12345!x'})
+        self.assertEqual(response.status_code, 302)
+
+
+class QueryStatsTests(ShopTestCase):
+    def recorder(self, count):
+        recorder = QueryRecorder()
+        recorder.count = count
+        return recorder
+
+    def test_stats_of_all_processes_are_summed(self):
+        workers = [QueryStats(), QueryStats()]
+        for worker, count in zip(workers, (3, 5)):
+            worker.record('test-view', self.recorder(count))
+            worker.flush()
+        workers[0].record('test-view', self.recorder(1))
+        workers[0].flush()
+        stats = get_query_stats()['test-view']
+        self.assertEqual((stats['requests'], stats['queries'], stats['max_queries']), (3, 9, 5))
+
+    def test_reset_drops_stats_of_all_processes(self):
+        worker = QueryStats()
+        worker.record('test-view', self.recorder(3))
+        worker.flush()
+        reset_query_stats()
+        self.assertNotIn('test-view', get_query_stats())
+        worker.flush()
+        self.assertNotIn('test-view', get_query_stats())
+
+
+class InventoryTests(ShopTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.products[0]
+        self.product.stock = 1
+        self.product.save()
+        self.other = User.objects.create_user('alice', password='pw12345!x')
+
+    def product_versions(self):
+        return get_versions([f'product:{self.product.pk}', 'products', 'catalog', 'recommendations'])
+
+    def assertAvailabilityFlipped(self, versions, available):
+        self.product.refresh_from_db()
+        self.assertIs(self.product.availability, available)
+        self.assertTrue(all(new != old for new, old in zip(self.product_versions(), versions)))
+        self.assertTrue(Task.objects.filter(name='refresh_catalog_summaries').exists())
+
+    def test_last_unit_cannot_be_reserved_twice(self):
+        versions = self.product_versions()
+        inventory.reserve(get_user_cart(self.user), {self.product: 1})
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.reserve(get_user_cart(self.other), {self.product: 1})
+        self.assertEqual(Reservation.objects.get().qty, 1)
+        self.assertAvailabilityFlipped(versions, False)
+        run_pending()
+        self.assertEqual(CategorySummary.objects.get(category=self.category).in_stock_count, 4)
+
+    def test_release_returns_product_to_stock(self):
+        cart = get_user_cart(self.user)
+        inventory.reserve(cart, {self.product: 1})
+        Task.objects.all().delete()
+        versions = self.product_versions()
+        inventory.release(cart, {self.product: 1})
+        self.assertFalse(Reservation.objects.exists())
+        self.assertAvailabilityFlipped(versions, True)
+
+    def test_expired_reservations_are_released(self):
+        inventory.reserve(get_user_cart(self.user), {self.product: 1})
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        Task.objects.all().delete()
+        versions = self.product_versions()
+        self.assertEqual(inventory.release_expired(), 1)
+        self.assertAvailabilityFlipped(versions, True)
+        inventory.reserve(get_user_cart(self.other), {self.product: 1})
+
+
+class CatalogSummaryTests(ShopTestCase):
+    def test_review_and_product_changes_are_summarized_by_task(self):
+        run_pending()
+        Review.objects.create(product=self.products[2], owner=self.user, stars='4', text='Хорошо')
+        self.products[0].price = Decimal('1.00')
+        self.products[0].save()
+        summary = CompanySummary.objects.get(company=self.company)
+        self.assertEqual(summary.price_min, Decimal('10.50'))
+        run_pending()
+        summary.refresh_from_db()
+        self.assertEqual((summary.price_min, summary.rating_avg), (Decimal('1.00'), Decimal('4')))
+        self.assertEqual(summary.top_products[0]['id'], self.products[2].pk)
+
+
+class RelatedProductsTests(ShopTestCase):
+    def test_latest_available_products_of_category(self):
+        self.products[4].stock = 0
+        self.products[4].save()
+        with self.assertNumQueries(1):
+            related = related_products(self.products[0])
+        self.assertEqual(related, [self.products[3], self.products[2], self.products[1]])
+
+
+class ImportCatalogTests(ShopTestCase):
+    def import_file(self, kind, content, *args, suffix='.csv'):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8') as file:
+            file.write(content)
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_catalog', kind, file.name, '--skip-refresh', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def export(self, kind, suffix='.csv'):
+        with tempfile.NamedTemporaryFile('r', suffix=suffix, encoding='utf-8') as file:
+            call_command('export_catalog', kind, file.name, '--chunk-size', '2', stderr=io.StringIO())
+            return file.read()
+
+    def test_export_import_round_trip_in_batches(self):
+        content = self.export('products').replace('iPhone 0', 'iPhone Zero')
+        content += ',iPad,big,99.90,3,,Apple,Tablets\n,Broken,,abc,1,,Apple,Phones\n,Ghost,,1,1,,Nope,Phones\n'
+        out, err = self.import_file('products', content, '--batch-size', '2')
+        self.assertIn('создано: 1, обновлено: 5, ошибок: 2', out)
+        self.assertIn('Строка 7: неверное значение price: abc', err)
+        self.assertIn('Строка 8: неизвестный бренд Nope', err)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).title, 'iPhone Zero')
+        ipad = Product.objects.get(title='iPad')
+        self.assertEqual((ipad.category.title, ipad.stock, ipad.availability), ('Tablets', 3, True))
+
+    def test_jsonl_companies(self):
+        User.objects.create_user('alice', password='pw12345!x')
+        content = json.dumps({'title': 'Samsung', 'owner': 'alice', 'speciality': 'Phones'}, ensure_ascii=False)
+        out, _ = self.import_file('companies', content + '\n', suffix='.jsonl')
+        self.assertIn('создано: 1', out)
+        exported = [json.loads(line) for line in self.export('companies', suffix='.jsonl').splitlines()]
+        self.assertEqual([row['speciality'] for row in exported], ['Tech', 'Phones'])
+
+    def test_constraint_violation_names_row(self):
+        User.objects.create_user('alice', password='pw12345!x')
+        content = 'title,owner,speciality\nSamsung,alice,Tech\nLG,bob,Tech\n'
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.import_file('companies', content)
+        self.assertTrue(Company.objects.filter(title='Samsung').exists())
+
+    def test_new_categories_with_same_title_keep_own_brands(self):
+        Category.objects.create(title='TV')
+        self.import_file('categories', 'title,brands\nTV,Apple\nTV,\n')
+        brands = [list(category.brand.values_list('title', flat=True)) for category in Category.objects.filter(
+            title='TV').order_by('pk')]
+        self.assertEqual(brands, [[], ['Apple'], []])
+
+
+class TaskQueueTests(ShopTestCase):
+    def test_abandoned_running_task_is_retried(self):
+        Task.objects.all().delete()
+        task = enqueue('refresh_catalog_summaries', product_ids=[self.products[0].pk])
+        started_at = timezone.now() - timedelta(seconds=settings.TASK_LEASE_TIMEOUT + 1)
+        Task.objects.filter(pk=task.pk).update(status=Task.RUNNING, started_at=started_at)
+        self.assertEqual(run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.DONE, 2))
+
+    def test_done_tasks_are_purged_after_retention(self):
+        Task.objects.all().delete()
+        old, recent = [enqueue('refresh_catalog_summaries', product_ids=[self.products[0].pk]) for _ in range(2)]
+        run_pending()
+        started_at = timezone.now() - timedelta(seconds=settings.TASK_DONE_RETENTION + 1)
+        Task.objects.filter(pk=old.pk).update(started_at=started_at)
+        run_pending()
+        self.assertEqual(list(Task.objects.values_list('pk', 'status')), [(recent.pk, Task.DONE)])
+
+    def test_running_task_within_lease_is_left_alone(self):
+        Task.objects.all().delete()
+        task = enqueue('refresh_catalog_summaries', product_ids=[self.products[0].pk])
+        Task.objects.filter(pk=task.pk).update(status=Task.RUNNING, started_at=timezone.now())
+        self.assertEqual(run_pending(), 0)
+        self.assertEqual(Task.objects.get(pk=task.pk).status, Task.RUNNING)
+
+    def test_order_emails_are_not_html_escaped(self):
+        self.user.username = 'o\'brien'
+        self.user.save()
+        cart = get_user_cart(self.user)
+        add_to_cart(cart, self.user, {self.products[0]: 1})
+        place_order(cart, self.user, {
+            'first_name': 'Tom & Jerry', 'last_name': 'O\'Neil', 'address': '<Street>', 'phone': '1',
+            'email': 'bob@example.com', 'comment': '"fast"', 'date_at': timezone.localdate(),
+        })
+        run_pending()
+        bodies = [message.body for message in mail.outbox]
+        self.assertEqual(len(bodies), 2)
+        for body in bodies:
+            self.assertIn('Tom & Jerry', body)
+            self.assertNotIn('&amp;', body)
+        self.assertIn('<Street>', bodies[0])
+
+
+@override_settings(QUERY_STATS_HEADERS=False)
+class BenchmarkHeaderTests(ShopTestCase):
+    def test_query_count_is_reported_to_benchmark_without_debug(self):
+        self.assertNotIn('X-Query-Count', self.client.get('/catalog/'))
+        response = self.client.get('/catalog/', HTTP_X_BENCHMARK='1')
+        self.assertEqual(response['X-Query-Count'], '0')
+
+    def test_benchmark_header_is_ignored_for_external_addresses(self):
+        response = self.client.get('/catalog/', HTTP_X_BENCHMARK='1', REMOTE_ADDR='10.0.0.1')
+        self.assertNotIn('X-Query-Count', response)
+
+    @override_settings(DEBUG=True)
+    def test_toolbar_is_hidden_from_benchmark(self):
+        request = RequestFactory().get('/', HTTP_X_BENCHMARK='1')
+        self.assertFalse(show_toolbar(request))
+        self.assertTrue(show_toolbar(RequestFactory().get('/')))
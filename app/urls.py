@@ -1,5 +1,11 @@
+from django.conf import settings
 from django.urls import path
 
+from app.api import (
+    ProductListApi, ProductDetailApi, CategoryListApi, CategoryDetailApi, CompanyListApi, CompanyDetailApi,
+    ReviewListApi,
+)
+from app import async_views
 from app.views import (
     MainView,
     DetailProductView,
@@ -9,20 +15,45 @@ from app.views import (
     CatalogListView,
     DetailCompanyView,
     CategoryDetailView, FavoritesView, AddToFavorites, DelFromFavorites, MakeOrderView, ChangeQty,
+    SearchView, AddManyToCart, AddManyToFavorites, DelManyFromFavorites,
 )
 
+if settings.ASYNC_CATALOG_VIEWS:
+    main_view = async_views.main_view
+    detail_product_view = async_views.detail_product_view
+    catalog_view = async_views.catalog_view
+    detail_company_view = async_views.detail_company_view
+    category_detail_view = async_views.category_detail_view
+else:
+    main_view = MainView.as_view()
+    detail_product_view = DetailProductView.as_view()
+    catalog_view = CatalogListView.as_view()
+    detail_company_view = DetailCompanyView.as_view()
+    category_detail_view = CategoryDetailView.as_view()
+
 urlpatterns = [
-    path('', MainView.as_view(), name='home'),
-    path('products/<int:pk>', DetailProductView.as_view(), name='detail_product'),
+    path('', main_view, name='home'),
+    path('products/<int:pk>', detail_product_view, name='detail_product'),
     path('add-to-cart/product/<int:pk>', AddToCart.as_view(), name='cart-add'),
+    path('add-to-cart/', AddManyToCart.as_view(), name='cart-add-many'),
     path('delete/from/cart/<int:pk>', DeleteFromCart.as_view(), name='delete_from_cart'),
-    path('catalog/', CatalogListView.as_view(), name='catalog'),
-    path('comapny/<int:pk>/', DetailCompanyView.as_view(), name='detail_company'),
-    path('category/<int:pk>', CategoryDetailView.as_view(), name='detail_category'),  # Изменить на slug
+    path('catalog/', catalog_view, name='catalog'),
+    path('comapny/<int:pk>/', detail_company_view, name='detail_company'),
+    path('category/<int:pk>', category_detail_view, name='detail_category'),  # Изменить на slug
     path('cart/', CartView.as_view(), name='cart'),
     path('favorites/', FavoritesView.as_view(), name='favorites'),
     path('add-to-favorites/product/<int:pk>', AddToFavorites.as_view(), name='favorites-add'),
     path('del-from-favorites/product/<int:pk>', DelFromFavorites.as_view(), name='favorites-del'),
+    path('add-to-favorites/', AddManyToFavorites.as_view(), name='favorites-add-many'),
+    path('del-from-favorites/', DelManyFromFavorites.as_view(), name='favorites-del-many'),
     path('order/', MakeOrderView.as_view(), name='order'),
     path('change-qty/<int:pk>', ChangeQty.as_view(), name='qty'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('api/v1/products/', ProductListApi.as_view(), name='api-products'),
+    path('api/v1/products/<int:pk>/', ProductDetailApi.as_view(), name='api-product'),
+    path('api/v1/products/<int:pk>/reviews/', ReviewListApi.as_view(), name='api-product-reviews'),
+    path('api/v1/categories/', CategoryListApi.as_view(), name='api-categories'),
+    path('api/v1/categories/<int:pk>/', CategoryDetailApi.as_view(), name='api-category'),
+    path('api/v1/companies/', CompanyListApi.as_view(), name='api-companies'),
+    path('api/v1/companies/<int:pk>/', CompanyDetailApi.as_view(), name='api-company'),
 ]
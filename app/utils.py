@@ -1,8 +1,67 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from app.models import CartProduct, Product
+from app.summary import invalidate_user_summary
+
+
+def cart_totals_expressions(prefix=''):
+    return {
+        'lines_qty': Coalesce(models.Sum(f'{prefix}qty'), 0),
+        'lines_price': Coalesce(
+            models.Sum(f'{prefix}final_price'), 0, output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        ),
+    }
+
+
+def cart_totals_subqueries():
+    # Итоги корзины из ее строк внутри UPDATE: пересчет и запись одним запросом, так что изменение,
+    # внесенное apply_cart_delta между чтением и записью, не теряется
+    lines = CartProduct.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    return {
+        'final_quantity': Coalesce(Subquery(lines.annotate(total=models.Sum('qty')).values('total')), 0),
+        'final_price': Coalesce(
+            Subquery(lines.annotate(total=models.Sum('final_price')).values('total')), 0,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+    }
+
+
+def apply_cart_delta(cart, qty_delta, price_delta):
+    if not qty_delta and not price_delta:
+        return
+    type(cart).objects.filter(pk=cart.pk).update(
+        final_quantity=F('final_quantity') + qty_delta,
+        final_price=F('final_price') + price_delta,
+    )
+    cart.final_quantity += qty_delta
+    cart.final_price = Decimal(cart.final_price) + price_delta
+    invalidate_user_summary(cart.owner_id)
+
+
+def apply_rating_delta(product_id, stars, sign):
+    stars = int(stars)
+    new_count = F('rating_count') + sign
+    new_sum = F('rating_sum') + sign * stars
+    Product.objects.filter(pk=product_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Coalesce(
+            Cast(new_sum, models.FloatField()) / NullIf(new_count, 0),
+            0,
+            output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        ),
+        **{f'rating_{stars}': F(f'rating_{stars}') + sign},
+    )
 
 
-def recount_cart(cart):
-    cart_data = cart.products.aggregate(models.Sum('final_price'), models.Sum('qty'))
-    cart.final_price = cart_data['final_price__sum']
-    cart.final_quantity = cart_data['qty__sum']
-    cart.save()
+def related_products(product):
+    # Последние товары той же категории в наличии: одна выборка по индексу (category, availability, id)
+    return list(
+        Product.objects.filter(category_id=product.category_id, availability=True).exclude(pk=product.pk)
+        .order_by('-pk')[:settings.RELATED_PRODUCTS_LIMIT]
+    )
@@ -1,17 +1,27 @@
+from collections import Counter
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q, Avg
-from django.http import Http404
+from django.db import transaction
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.generic import TemplateView, ListView
 from django.views.generic.base import View
 
-from app.forms import ReviewForm, OrderForm, ChangeQtyForm
+from app.forms import ReviewForm, OrderForm, ChangeQtyForm, ProductFilterForm
+from app.cart import add_to_cart
+from app.favorites import favorite_ids, add_favorites, remove_favorites
+from app.checkout import place_order, CheckoutError
+from app.inventory import OutOfStock, reserve, release
 from app.mixins import CartMixin, FavoritesMixin
-from app.models import Product, CartProduct, Review, Category, Company, Favorites, FavoriteProduct, Order
-from app.utils import recount_cart
+from app.models import Product, CartProduct, Review, Category, Company, FavoriteProduct
+from app.pagination import KeysetPaginator, keyset_page_urls
+from app.recommendations import bought_together, recommended_for
+from app.search import search_products
+from app.utils import apply_cart_delta, related_products
 
 
 def page404(request, exception):
@@ -23,89 +33,125 @@ class MainView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(MainView, self).get_context_data()
-        context['products'] = Product.objects.filter(availability=True)[:6]
+        context['products'] = Product.objects.filter(availability=True).order_by('-pk')[:6]
+        context['favorite_ids'] = favorite_ids(self.request.user)
+        context['recommended_products'] = recommended_for(self.request.user)
         return context
 
 
 class AddToCart(CartMixin, View):
     def get(self, request, *args, **kwargs):
+        product = get_object_or_404(Product, pk=kwargs['pk'])
         if self.cart.anon:
-            messages.info(request, 'Зрегистрируйтесь для того чтобы добивить товар в корзину')
+            self.cart.add(product)
+            messages.info(request, 'Товар добавлен в корзину. Войдите, чтобы оформить заказ')
             return redirect('/login/')
-        else:
-            product = get_object_or_404(Product, pk=kwargs['pk'])
-            try:
-                product_for_cart = CartProduct.objects.get(product=product)
-                product_for_cart.qty += 1
-                product_for_cart.save()
-            except ObjectDoesNotExist:
-                product_for_cart = CartProduct.objects.create(
-                    product=product,
-                    cart=self.cart,
-                    user=request.user,
-                )
-            self.cart.products.add(product_for_cart)
-            recount_cart(self.cart)
-            return redirect('/cart/')
+        try:
+            add_to_cart(self.cart, request.user, {product: 1})
+        except OutOfStock as error:
+            messages.info(request, str(error))
+        return redirect('/cart/')
+
+
+class AddManyToCart(CartMixin, View):
+    def post(self, request, *args, **kwargs):
+        quantities = Counter(pk for pk in request.POST.getlist('product') if pk.isdigit())
+        products = Product.objects.in_bulk([int(pk) for pk in quantities])
+        if self.cart.anon:
+            for product in products.values():
+                self.cart.add(product, quantities[str(product.pk)])
+            messages.info(request, 'Товары добавлены в корзину. Войдите, чтобы оформить заказ')
+            return redirect('/login/')
+        try:
+            add_to_cart(self.cart, request.user, {
+                product: quantities[str(product.pk)] for product in products.values()
+            })
+        except OutOfStock as error:
+            messages.info(request, str(error))
+        return redirect('/cart/')
 
 
 class DeleteFromCart(CartMixin, View):
     def get(self, request, pk):
-        cart_product = CartProduct.objects.get(pk=pk)
-        cart_product.delete()
-        recount_cart(self.cart)
+        if self.cart.anon:
+            return redirect('/login/')
+        with transaction.atomic():
+            cart_product = get_object_or_404(
+                CartProduct.objects.select_for_update(of=('self',)).select_related('product'), pk=pk, cart=self.cart
+            )
+            release(self.cart, {cart_product.product: cart_product.qty})
+            cart_product.delete()
+            apply_cart_delta(self.cart, -cart_product.qty, -cart_product.final_price)
         return redirect('/cart/')
 
 
 @method_decorator(login_required, name='get')
 class CartView(CartMixin, View):
     def get(self, request):
-        return render(request, 'main/cart.html', context={'cart': self.cart, 'form': ChangeQtyForm})
+        context = {'cart': self.cart, 'lines': self.cart.products.select_related('product'), 'form': ChangeQtyForm}
+        return render(request, 'main/cart.html', context=context)
 
 
 class ChangeQty(CartMixin, View):
     def post(self, request, **kwargs):
-        product_cart = CartProduct.objects.get(user=request.user, pk=kwargs.get('pk'))
+        if self.cart.anon:
+            return redirect('/login/')
         form = ChangeQtyForm(request.POST)
-        if form.is_valid():
-            product_cart.qty = form.cleaned_data['number']
-            product_cart.save()
-            recount_cart(self.cart)
+        if not form.is_valid():
+            messages.info(request, ' '.join(form.errors['number']))
             return redirect('/cart/')
-        return render(request, 'main/cart.html', context={'cart': self.cart, 'form': form})
+        try:
+            with transaction.atomic():
+                product_cart = get_object_or_404(
+                    CartProduct.objects.select_for_update(of=('self',)).select_related('product'),
+                    user=request.user, cart=self.cart, pk=kwargs.get('pk'),
+                )
+                old_qty, old_price = product_cart.qty, product_cart.final_price
+                if not form.cleaned_data['number']:
+                    release(self.cart, {product_cart.product: old_qty})
+                    product_cart.delete()
+                    apply_cart_delta(self.cart, -old_qty, -old_price)
+                    return redirect('/cart/')
+                product_cart.qty = form.cleaned_data['number']
+                if product_cart.qty > old_qty:
+                    reserve(self.cart, {product_cart.product: product_cart.qty - old_qty})
+                else:
+                    release(self.cart, {product_cart.product: old_qty - product_cart.qty})
+                product_cart.save(update_fields=['qty', 'final_price'])
+                apply_cart_delta(self.cart, product_cart.qty - old_qty, product_cart.final_price - old_price)
+        except OutOfStock as error:
+            messages.info(request, str(error))
+        return redirect('/cart/')
 
 
-# продумать момент с instance
 class DetailProductView(View):
+    reviews_per_page = 10
+
     def get(self, request, pk):
         user = request.user
-        product = Product.objects.get(id=pk)
-        related_products = Product.objects.filter(
-            Q(category__title__icontains=product.category.title)
-        )
-        rate = product.review.aggregate(avg=Avg('stars'))['avg']
-        try:
-            form = ReviewForm(instance=product.review.get(owner=user))
-        except ObjectDoesNotExist:
-            form = ReviewForm
+        product = get_object_or_404(Product, id=pk)
+        reviews = Review.objects.filter(product=product).select_related('owner').order_by('-pk')
+        review = reviews.filter(owner=user).first() if user.is_authenticated else None
         context = {
             'product': product,
-            'related_products': related_products.select_related('category'),
-            'rate': rate,
-            'form': form,
+            'related_products': related_products(product),
+            'bought_together': SimpleLazyObject(lambda: bought_together(product.pk)),
+            'rate': product.rating_avg,
+            'reviews': SimpleLazyObject(
+                lambda: Paginator(reviews, self.reviews_per_page).get_page(request.GET.get('page'))
+            ),
+            'form': ReviewForm(instance=review) if review else ReviewForm,
         }
         return render(request, 'main/detail_product.html', context=context)
 
     def post(self, request, *args, **kwargs):
         form = ReviewForm(request.POST)
         if form.is_valid():
-            product = Product.objects.get(pk=kwargs['pk'])
+            product = get_object_or_404(Product, pk=kwargs['pk'])
             defaults = form.cleaned_data
             if request.user.is_authenticated:
-                Review.objects.update_or_create(product=product, owner=request.user, defaults=defaults)
-                new_rev = Review.objects.get(product=product)
+                new_rev, _ = Review.objects.update_or_create(product=product, owner=request.user, defaults=defaults)
                 product.review.add(new_rev)
-                product.save()
                 messages.info(request, 'Спасибо за отзыв!')
                 return redirect('/')
             else:
@@ -119,84 +165,153 @@ class CatalogListView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(CatalogListView, self).get_context_data(**kwargs)
-        context['companies'] = Company.objects.all()
-        context['categories'] = Category.objects.all()
+        context['companies'] = Company.objects.select_related('summary')
+        context['categories'] = Category.objects.select_related('summary')
         return context
 
 
 class DetailCompanyView(View):  # Продумать логику
     def get(self, request, *args, **kwargs):
-        company = get_object_or_404(Company, pk=kwargs['pk'])
-        categories = Category.objects.filter(brand=company)
+        company = get_object_or_404(Company.objects.select_related('summary'), pk=kwargs['pk'])
+        summary = getattr(company, 'summary', None)
         context = {
-            'categories': categories,
+            'categories': summary.categories if summary else Category.objects.filter(brand=company),
             'company': company,
+            'summary': summary,
         }
         return render(request, 'main/detail_company.html', context=context)
 
 
+def category_products_page(request, category_id, per_page):
+    # Общая часть страницы категории для синхронной и асинхронной версий: фильтры и страница товаров
+    products = Product.objects.filter(category_id=category_id)
+    filter_form = ProductFilterForm(request.GET, brands=Company.objects.filter(category=category_id))
+    ordering = ProductFilterForm.SORT_ORDERING['newest']
+    if filter_form.is_valid():
+        products = filter_form.filter_queryset(products)
+        ordering = filter_form.get_ordering()
+    return filter_form, KeysetPaginator(products, ordering, per_page).get_page(request.GET.get('cursor'))
+
+
 class CategoryDetailView(View):
+    products_per_page = 12
+
     def get(self, request, *args, **kwargs):
         category = get_object_or_404(Category, pk=kwargs['pk'])
         categories = Category.objects.all().order_by('title')
-        products = Product.objects.filter(category=category)
+        filter_form, page = category_products_page(request, category.pk, self.products_per_page)
         context = {
             'category': category,
             'categories': categories,
-            'products': products,
+            'products': page,
+            'filter_form': filter_form,
+            **keyset_page_urls(request, page),
+            'favorite_ids': favorite_ids(request.user),
         }
         return render(request, 'main/detail_category.html', context=context)
 
 
+class SearchView(View):
+    results_per_page = 12
+
+    @staticmethod
+    def positive_int(value):
+        # Фильтры приходят из адресной строки: мусор вместо id просто не учитывается
+        return int(value) if value.isdigit() and int(value) > 0 else None
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        page = self.positive_int(request.GET.get('page', '1')) or 1
+        brand = self.positive_int(request.GET.get('brand', ''))
+        category = self.positive_int(request.GET.get('category', ''))
+        results = search_products(
+            query,
+            brand=brand,
+            category=category,
+            offset=(page - 1) * self.results_per_page,
+            limit=self.results_per_page,
+        )
+        context = {
+            'query': query,
+            'page': page,
+            'brand': brand,
+            'category': category,
+            'has_next': results['total'] > page * self.results_per_page,
+            **results,
+        }
+        return render(request, 'main/search.html', context=context)
+
+
 class AddToFavorites(FavoritesMixin, View):
     def get(self, request, *args, **kwargs):
         product = get_object_or_404(Product, pk=kwargs['pk'])
-        try:
-            fav_product = FavoriteProduct.objects.get(product=product)
-        except ObjectDoesNotExist:
-            fav_product = FavoriteProduct.objects.create(owner=request.user, product=product)
-        self.favorites.products.add(fav_product)
-        self.favorites.save()
+        add_favorites(request.user, [product.pk])
         return redirect('/favorites/')
 
 
 class DelFromFavorites(FavoritesMixin, View):
     def get(self, request, **kwargs):
-        try:
-            favorite = self.favorites.products.get(pk=kwargs['pk'])
-            favorite.delete()
-            return redirect('/favorites/')
-        except ObjectDoesNotExist:
-            raise Http404
+        favorite = get_object_or_404(FavoriteProduct, pk=kwargs['pk'], owner=request.user)
+        favorite.delete()
+        return redirect('/favorites/')
+
+
+class BulkFavoritesMixin(FavoritesMixin):
+    def get_product_ids(self):
+        ids = {int(pk) for pk in self.request.POST.getlist('product') if pk.isdigit()}
+        return list(Product.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+    def get_success_url(self):
+        next_url = self.request.POST.get('next')
+        if next_url and url_has_allowed_host_and_scheme(
+            next_url, allowed_hosts={self.request.get_host()}, require_https=self.request.is_secure()
+        ):
+            return next_url
+        return '/favorites/'
+
+
+class AddManyToFavorites(BulkFavoritesMixin, View):
+    def post(self, request, *args, **kwargs):
+        add_favorites(request.user, self.get_product_ids())
+        return redirect(self.get_success_url())
+
+
+class DelManyFromFavorites(BulkFavoritesMixin, View):
+    def post(self, request, *args, **kwargs):
+        remove_favorites(request.user, self.get_product_ids())
+        return redirect(self.get_success_url())
 
 
 class FavoritesView(FavoritesMixin, ListView):
     template_name = 'main/favorites.html'
-    model = Favorites
+    model = FavoriteProduct
     paginate_by = 3
 
     def get_queryset(self):
-        return FavoriteProduct.objects.filter(owner=self.request.user).select_related('product')
+        return FavoriteProduct.objects.filter(owner=self.request.user).select_related('product').order_by('-pk')
 
 
 class MakeOrderView(CartMixin, View):
     def get(self, request):
-        return render(request, 'main/order.html', context={'form': OrderForm, 'cart': self.cart})
+        if self.cart.anon:
+            return redirect('/login/')
+        context = {'form': OrderForm, 'cart': self.cart, 'lines': self.cart.products.select_related('product')}
+        return render(request, 'main/order.html', context=context)
 
     def post(self, request, *args, **kwargs):
+        if self.cart.anon:
+            return redirect('/login/')
         form = OrderForm(request.POST)
         if form.is_valid():
-            self.cart.in_order = True
-            self.cart.save()
-            defaults = form.cleaned_data
-            Order.objects.create(
-                defaults=defaults,
-                owner=request.user,
-                cart=self.cart
-            )
-            messages.info(request, 'Спасибо за заказ!')
-            return redirect('/')
-        return render(request, 'main/order.html', context={'form': form, 'cart': self.cart})
+            try:
+                place_order(self.cart, request.user, form.cleaned_data)
+            except CheckoutError as error:
+                form.add_error(None, str(error))
+            else:
+                messages.info(request, 'Спасибо за заказ!')
+                return redirect('/')
+        context = {'form': form, 'cart': self.cart, 'lines': self.cart.products.select_related('product')}
+        return render(request, 'main/order.html', context=context)
 # Сделать change_qty в Cart
 # Сделать нормальный профиль с заказами
 # Досмотреть ролик про пагинацию, админку
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def get_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def invalidate_user(user_id):
+    # После коммита: иначе параллельный запрос успел бы положить в кэш еще старую запись
+    transaction.on_commit(lambda: get_cache().delete(user_cache_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    # request.user на каждой странице читается из кэша, а не из auth_user;
+    # запись сбрасывается сигналом при любом сохранении пользователя
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # Следующий в списке ModelBackend нужен только старым сессиям: без отказа здесь
+            # он еще раз прогнал бы хэшер на каждом неверном пароле
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        cache = get_cache()
+        user = cache.get(user_cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(user_cache_key(user_id), user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
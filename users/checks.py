@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security, deploy=True)
+def check_throttle_cache(app_configs, **kwargs):
+    backend = settings.CACHES[settings.THROTTLE_CACHE_ALIAS]['BACKEND']
+    if backend != settings.LOCMEM_CACHE:
+        return []
+    return [
+        Error(
+            f'Счетчики попыток входа в {backend} не общие для воркеров',
+            hint='Ограничение входа и регистрации умножается на число воркеров; '
+                 'задайте THROTTLE_CACHE_BACKEND или CACHE_BACKEND',
+            id='users.E001',
+        )
+    ]
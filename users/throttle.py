@@ -0,0 +1,79 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Скользящее окно из двух соседних интервалов: число событий в прошлом интервале берется с весом
+# той его части, что еще попадает в окно. Хранится всего два счетчика на ключ
+
+
+def get_cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def _keys(scope, ident, window, now):
+    # Логин приходит от клиента как есть, поэтому в ключ кэша идет его хэш
+    ident = hashlib.md5(ident.encode()).hexdigest()
+    bucket = int(now // window)
+    return f'throttle:{scope}:{ident}:{bucket}', f'throttle:{scope}:{ident}:{bucket - 1}'
+
+
+def rate(scope, ident, window):
+    now = time.time()
+    current_key, previous_key = _keys(scope, ident, window, now)
+    counts = get_cache().get_many([current_key, previous_key])
+    elapsed = now % window / window
+    return counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+
+
+def hit(scope, ident, window):
+    cache = get_cache()
+    current_key, _ = _keys(scope, ident, window, time.time())
+    # Счетчик живет два интервала: в следующем он еще нужен как предыдущий
+    if not cache.add(current_key, 1, timeout=window * 2):
+        try:
+            cache.incr(current_key)
+        except ValueError:
+            cache.set(current_key, 1, timeout=window * 2)
+
+
+def reset(scope, ident, window):
+    get_cache().delete_many(_keys(scope, ident, window, time.time()))
+
+
+def client_ip(request):
+    return request.META.get(settings.THROTTLE_CLIENT_IP_HEADER, '')
+
+
+class Throttle:
+    # Правила в настройке setting_name: {scope: (limit, window в секундах)};
+    # ident для каждого scope передается в check/hit/reset
+    def __init__(self, name, setting_name):
+        self.name = name
+        self.setting_name = setting_name
+
+    @property
+    def rules(self):
+        return getattr(settings, self.setting_name)
+
+    def check(self, idents):
+        for scope, ident in idents.items():
+            limit, window = self.rules[scope]
+            if ident and rate(f'{self.name}:{scope}', ident, window) >= limit:
+                return False
+        return True
+
+    def hit(self, idents):
+        for scope, ident in idents.items():
+            if ident:
+                hit(f'{self.name}:{scope}', ident, self.rules[scope][1])
+
+    def reset(self, idents):
+        for scope, ident in idents.items():
+            if ident:
+                reset(f'{self.name}:{scope}', ident, self.rules[scope][1])
+
+
+login_throttle = Throttle('login', 'LOGIN_THROTTLE')
+registration_throttle = Throttle('registration', 'REGISTRATION_THROTTLE')
@@ -1,24 +1,52 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
 from django.shortcuts import render, redirect
 from django.contrib.auth.views import LoginView
 from django.utils.decorators import method_decorator
 from django.views.generic.base import View
 
 from .forms import MyRegistrationForm, ProfileForm
+from .throttle import client_ip, login_throttle, registration_throttle
+
+THROTTLED_MESSAGE = 'Слишком много попыток. Попробуйте позже'
 
 
 class MyLoginView(LoginView):
     template_name = 'users/login.html'
     redirect_authenticated_user = True
 
+    def get_throttle_idents(self):
+        return {
+            'ip': client_ip(self.request),
+            'username': self.request.POST.get('username', '').strip().lower(),
+        }
+
+    def post(self, request, *args, **kwargs):
+        # Лимит проверяется до валидации формы: отклоненная попытка не стоит хэширования пароля
+        if not login_throttle.check(self.get_throttle_idents()):
+            messages.info(request, THROTTLED_MESSAGE)
+            return self.render_to_response(self.get_context_data(form=self.get_form_class()(request)), status=429)
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        login_throttle.reset({'username': self.get_throttle_idents()['username']})
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        login_throttle.hit(self.get_throttle_idents())
+        return super().form_invalid(form)
+
 
 class MyRegistrationView(View):
     def get(self, request):
         return render(request, 'users/registration.html', context={'form': MyRegistrationForm})
 
     def post(self, request, *args, **kwargs):
+        idents = {'ip': client_ip(request)}
+        if not registration_throttle.check(idents):
+            messages.info(request, THROTTLED_MESSAGE)
+            return render(request, 'users/registration.html', context={'form': MyRegistrationForm}, status=429)
+        registration_throttle.hit(idents)
         form = MyRegistrationForm(request.POST)
         if form.is_valid():
             form.save()
@@ -33,13 +61,10 @@ class ProfileView(View):
         return render(request, 'users/profile.html', context={'form': ProfileForm(instance=user)})
 
     def post(self, request):
-        form = ProfileForm(request.POST)
+        form = ProfileForm(request.POST, instance=request.user)
         if form.is_valid():
-            user = User.objects.get(username=request.user.username)
-            user.first_name = form.cleaned_data['first_name']
-            user.last_name = form.cleaned_data['last_name']
-            user.email = form.cleaned_data['email']
-            user.save()
+            # request.user может быть из кэша, поэтому пишутся только поля формы
+            form.save(commit=False).save(update_fields=form.Meta.fields)
             messages.info(request, 'Профиль обнолвен!')
             return redirect('/profile/')
         return render(request, 'users/profile.html', context={'form': form})